@@ -0,0 +1,31 @@
+import asyncio
+import threading
+
+class BackgroundLoop:
+    """A long-lived event loop on its own daemon thread, for async clients that must stay bound to a single loop."""
+
+    def __init__(self, name="background"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name=f"{self.name}-loop", daemon=True)
+                thread.start()
+                self.loop = loop
+            return self.loop
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.ensure_loop())
+
+    async def arun(self, coroutine):
+        if asyncio.get_running_loop() is self.ensure_loop():
+            return await coroutine
+        return await asyncio.wrap_future(self.submit(coroutine))
+
+    def run(self, coroutine):
+        # Blocking entry point for sync code, replaces asyncio.run so the work shares the loop's clients.
+        return self.submit(coroutine).result()
@@ -0,0 +1,113 @@
+import time
+import threading
+from google.genai import types
+from api.response_cache import ResponseCache
+from api.rate_limiter import estimate_tokens
+
+class CachedPrefix:
+    def __init__(self, key, system_instruction, context=None, name=None, expires_at=0.0):
+        self.key = key
+        self.system_instruction = system_instruction
+        self.context = context
+        self.name = name
+        self.expires_at = expires_at
+
+    def is_cached(self):
+        return self.name is not None and self.expires_at > time.time()
+
+    def invalidate(self):
+        self.name = None
+        self.expires_at = 0.0
+
+class ContextCacheManager:
+    """Registers lesson-level prompt prefixes as Gemini cached contents and falls back to inlining them."""
+
+    def __init__(self, client, model, ttl=900, min_tokens=32768):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "fallbacks": 0, "expired": 0, "errors": 0}
+
+    def register(self, system_instruction, context=None, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        key = ResponseCache.make_key(self.model, system_instruction, context)
+        with self.lock:
+            self.sweep()
+            entry = self.entries.get(key)
+            if entry is not None and entry.is_cached():
+                self.stats["reused"] += 1
+                return entry
+        prefix = CachedPrefix(key, system_instruction, context)
+        if not self.can_cache(estimate_tokens([system_instruction, context])):
+            return prefix
+        try:
+            cached_content = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    contents=[context] if context else None,
+                    ttl=f"{int(ttl)}s",
+                ),
+            )
+        except Exception as e:
+            print(f"Context cache unavailable, inlining the prefix instead: {e}")
+            with self.lock:
+                self.stats["errors"] += 1
+            return prefix
+        prefix.name = cached_content.name
+        # Expire locally a little before the server does so calls never reference a dead cache.
+        prefix.expires_at = time.time() + ttl - min(30, ttl / 10)
+        with self.lock:
+            self.entries[key] = prefix
+            self.stats["created"] += 1
+        return prefix
+
+    def can_cache(self, tokens):
+        return tokens >= self.min_tokens
+
+    @staticmethod
+    def is_cache_rejection(error):
+        # An expired or deleted cache comes back as NOT_FOUND or PERMISSION_DENIED naming the cached content.
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        message = str(error).lower().replace(" ", "")
+        return code in (None, 400, 403, 404) and "cachedcontent" in message
+
+    def sweep(self):
+        expired = [key for key, entry in self.entries.items() if not entry.is_cached()]
+        for key in expired:
+            del self.entries[key]
+        self.stats["expired"] += len(expired)
+
+    def release(self, prefix):
+        if prefix.name is None:
+            return
+        name = prefix.name
+        prefix.invalidate()
+        with self.lock:
+            self.entries.pop(prefix.key, None)
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            print(f"Could not delete context cache {name}: {e}")
+
+    def apply(self, prefix, contents, config):
+        if prefix is None:
+            return contents, config
+        config = config if config is not None else types.GenerateContentConfig()
+        if prefix.is_cached():
+            return contents, config.model_copy(update={"cached_content": prefix.name})
+        with self.lock:
+            self.stats["fallbacks"] += 1
+        config = config.model_copy(update={"system_instruction": prefix.system_instruction})
+        if prefix.context:
+            contents = [prefix.context] + (list(contents) if isinstance(contents, list) else [contents])
+        return contents, config
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["active"] = sum(1 for entry in self.entries.values() if entry.is_cached())
+        return stats
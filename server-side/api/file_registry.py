@@ -0,0 +1,109 @@
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class UploadedFileRegistry:
+    """Remembers uploaded Gemini files by content hash so identical uploads reuse the remote handle."""
+
+    def __init__(self, ttl=24 * 3600, max_entries=256, expiry_margin=600, sweep_interval=900):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.cleanup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini-file-cleanup")
+        self.stats = {"hits": 0, "misses": 0, "uploads": 0, "deleted": 0, "delete_errors": 0}
+        self.sweep_interval = sweep_interval
+        if sweep_interval > 0:
+            threading.Thread(target=self.sweep_forever, name="gemini-file-sweeper", daemon=True).start()
+
+    @staticmethod
+    def hash_file(file_path, mime_type=None, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        if mime_type:
+            digest.update(mime_type.encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_valid(self, entry, now):
+        file, client, expires_at = entry
+        if expires_at <= now:
+            return False
+        expiration_time = getattr(file, "expiration_time", None)
+        if isinstance(expiration_time, datetime):
+            remaining = (expiration_time - datetime.now(timezone.utc)).total_seconds()
+            return remaining > self.expiry_margin
+        return True
+
+    def get(self, content_hash):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(content_hash)
+            if entry is not None and self.is_valid(entry, now):
+                self.entries.move_to_end(content_hash)
+                self.stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[content_hash]
+                self.schedule_delete(entry[1], entry[0])
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, content_hash, file, client):
+        with self.lock:
+            previous = self.entries.pop(content_hash, None)
+            if previous is not None and previous[0].name != file.name:
+                self.schedule_delete(previous[1], previous[0])
+            self.entries[content_hash] = (file, client, time.time() + self.ttl)
+            self.stats["uploads"] += 1
+            while len(self.entries) > self.max_entries:
+                _, (evicted_file, evicted_client, _) = self.entries.popitem(last=False)
+                self.schedule_delete(evicted_client, evicted_file)
+        self.sweep()
+
+    def forget(self, file):
+        with self.lock:
+            for content_hash, entry in list(self.entries.items()):
+                if entry[0].name == file.name:
+                    del self.entries[content_hash]
+
+    def schedule_delete(self, client, file):
+        self.cleanup_executor.submit(self.delete_remote, client, file)
+
+    def delete_remote(self, client, file):
+        try:
+            client.files.delete(name=file.name)
+            with self.lock:
+                self.stats["deleted"] += 1
+        except Exception as e:
+            print(f"Could not delete uploaded file {file.name}: {e}")
+            with self.lock:
+                self.stats["delete_errors"] += 1
+
+    def sweep(self):
+        now = time.time()
+        with self.lock:
+            for content_hash, entry in list(self.entries.items()):
+                if not self.is_valid(entry, now):
+                    del self.entries[content_hash]
+                    self.schedule_delete(entry[1], entry[0])
+
+    def sweep_forever(self):
+        # Expired uploads are deleted in the background even if their content is never requested again.
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Uploaded file sweep failed: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        return stats
@@ -1,96 +1,364 @@
 import os
-import ast
 import time
+import asyncio
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-import time 
+from api.response_cache import ResponseCache
+from api.retry_policy import RetryPolicy, ResponseTruncated, ResponseParseError, PARSE
+from api.json_parser import JSON_SALVAGE_PARSER, REPAIRED
+from api.rate_limiter import RateLimiter, estimate_tokens
+from api.context_cache import ContextCacheManager
+from api.file_registry import UploadedFileRegistry
+from api.image_optimizer import ImagePayloadOptimizer
+from api.telemetry import LLM_TELEMETRY
+from api.background_loop import BackgroundLoop
 load_dotenv()
 os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
+
+GEMINI_RESPONSE_CACHE = ResponseCache(
+    namespace="gemini",
+    ttl=int(os.getenv("GEMINI_CACHE_TTL", 7 * 24 * 3600)),
+    max_memory_entries=int(os.getenv("GEMINI_CACHE_MEMORY_ENTRIES", 512)),
+    max_disk_entries=int(os.getenv("GEMINI_CACHE_DISK_ENTRIES", 20000)),
+    persistent=os.getenv("GEMINI_CACHE_PERSISTENT", "true") == "true",
+)
+
+GEMINI_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", 5)),
+    base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", 1.0)),
+    max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", 30.0)),
+    deadline=float(os.getenv("GEMINI_RETRY_DEADLINE", 180.0)),
+    name="Gemini",
+)
+GEMINI_RATE_LIMITER = RateLimiter(
+    requests_per_minute=int(os.getenv("GEMINI_RPM", 2000)),
+    tokens_per_minute=int(os.getenv("GEMINI_TPM", 4000000)),
+    name="Gemini",
+)
+GEMINI_REQUEST_TIMEOUT_MS = int(os.getenv("GEMINI_REQUEST_TIMEOUT_MS", 120000))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+GEMINI_FILE_PROCESSING_TIMEOUT = float(os.getenv("GEMINI_FILE_PROCESSING_TIMEOUT", 300))
+GEMINI_FILE_REGISTRY = UploadedFileRegistry(
+    ttl=int(os.getenv("GEMINI_FILE_REGISTRY_TTL", 24 * 3600)),
+    max_entries=int(os.getenv("GEMINI_FILE_REGISTRY_ENTRIES", 256)),
+    sweep_interval=float(os.getenv("GEMINI_FILE_SWEEP_INTERVAL", 900)),
+)
+GEMINI_IMAGE_OPTIMIZER = ImagePayloadOptimizer(
+    max_edge=int(os.getenv("GEMINI_IMAGE_MAX_EDGE", 1024)),
+    quality=int(os.getenv("GEMINI_IMAGE_QUALITY", 85)),
+)
+GEMINI_EXPLANATION_CACHE = ResponseCache(
+    namespace="image_explanations",
+    ttl=int(os.getenv("GEMINI_EXPLANATION_CACHE_TTL", 30 * 24 * 3600)),
+    max_memory_entries=int(os.getenv("GEMINI_EXPLANATION_CACHE_MEMORY_ENTRIES", 256)),
+    persistent=os.getenv("GEMINI_CACHE_PERSISTENT", "true") == "true",
+)
+# genai's async client binds its HTTP connections to one event loop, so every aio call is run on this one.
+GEMINI_LOOP = BackgroundLoop(name="gemini")
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 900))
+# The smallest context gemini-1.5-flash will cache, lower it together with the model.
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 32768))
+
 class GeminiProvider:
-    def __init__(self, profile=None, tools=None):
-        self.gemini_client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
+    def __init__(self, profile=None, tools=None, cache=None, retry_policy=None, rate_limiter=None, caller="default", telemetry=None):
+        self.gemini_client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"], http_options=types.HttpOptions(timeout=GEMINI_REQUEST_TIMEOUT_MS, base_url=GEMINI_BASE_URL))
         self.model = "gemini-1.5-flash"
+        self.cache = cache if cache is not None else GEMINI_RESPONSE_CACHE
+        self.retry_policy = retry_policy if retry_policy is not None else GEMINI_RETRY_POLICY
+        self.json_parser = JSON_SALVAGE_PARSER
+        self.rate_limiter = rate_limiter if rate_limiter is not None else GEMINI_RATE_LIMITER
+        self.caller = caller
+        self.telemetry = telemetry if telemetry is not None else LLM_TELEMETRY
+        self.file_registry = GEMINI_FILE_REGISTRY
+        self.image_optimizer = GEMINI_IMAGE_OPTIMIZER
+        self.explanation_cache = GEMINI_EXPLANATION_CACHE
+        self.loop = GEMINI_LOOP
+        self.context_caches = ContextCacheManager(self.gemini_client, self.model, ttl=GEMINI_CONTEXT_CACHE_TTL, min_tokens=GEMINI_CONTEXT_CACHE_MIN_TOKENS)
         if profile and tools:
             self.chat= self.initialize_assistant(profile, tools)
         else:
             self.chat = None
 
-    def generate_response(self, prompt, remove_literals=False):
-        completion = self.gemini_client.models.generate_content(model= self.model, contents=prompt)
-        if remove_literals:
-            output = ast.literal_eval(completion.text)
-        else:
-            output = completion.text
+    def cache_key(self, contents, config=None, prefix=None):
+        if prefix is not None:
+            return ResponseCache.make_key(self.model, contents, config, prefix.key)
+        return ResponseCache.make_key(self.model, contents, config)
+
+    def cached_text(self, key, use_cache):
+        if not use_cache:
+            self.cache.record_bypass()
+            return None
+        return self.cache.get(key)
+
+    def parse_json(self, text):
+        return self.json_parser.parse(text)
+
+    def build_generation_config(self, response_schema=None, markdown=False):
+        if markdown:
+            return types.GenerateContentConfig()
+        elif response_schema is None:
+            return types.GenerateContentConfig(
+                response_mime_type="application/json",
+                temperature=0.5
+            )
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema = response_schema,
+            temperature=0.5
+        )
+
+    def build_contents(self, prompt, file=None):
+        if file is not None:
+            return [types.Part.from_uri(file_uri=file.uri, mime_type=file.mime_type), prompt]
+        return prompt
+
+    def finish_reason(self, completion):
+        candidates = getattr(completion, "candidates", None) or []
+        reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        return getattr(reason, "name", reason)
+
+    def check_truncation(self, call, completion, allow_truncated):
+        # Retrying would hit the same output cap, so truncation is raised past the retry policy to the caller.
+        if not allow_truncated and self.finish_reason(completion) == "MAX_TOKENS":
+            raise ResponseTruncated(f"Gemini response hit the output token limit after {call.completion_tokens} tokens", category=PARSE, attempts=call.attempts)
+
+    def record_usage(self, estimated_tokens, completion):
+        usage = getattr(completion, "usage_metadata", None)
+        self.rate_limiter.record_usage(estimated_tokens, getattr(usage, "prompt_token_count", None))
+
+    def run(self, coroutine):
+        return self.loop.run(coroutine)
+
+    def register_prefix(self, system_instruction, context=None, ttl=None):
+        return self.context_caches.register(system_instruction, context, ttl)
+
+    async def aregister_prefix(self, system_instruction, context=None, ttl=None):
+        return await asyncio.to_thread(self.context_caches.register, system_instruction, context, ttl)
+
+    def can_cache_prefix(self, estimated_tokens):
+        return self.context_caches.can_cache(estimated_tokens)
+
+    def release_prefix(self, prefix):
+        if prefix is not None:
+            self.context_caches.release(prefix)
+
+    async def arelease_prefix(self, prefix):
+        await asyncio.to_thread(self.release_prefix, prefix)
+
+    def request_completion(self, contents, config, prefix):
+        request_contents, request_config = self.context_caches.apply(prefix, contents, config)
+        estimated_tokens = estimate_tokens(request_contents)
+        self.rate_limiter.acquire(estimated_tokens)
+        try:
+            completion = self.gemini_client.models.generate_content(model=self.model, contents=request_contents, config=request_config)
+        except Exception as e:
+            # Only a missing or expired cache is worth inlining for, anything else goes to the retry policy as is.
+            if prefix is None or not prefix.is_cached() or not self.context_caches.is_cache_rejection(e):
+                raise
+            print("Cached context rejected, retrying with the prefix inlined...")
+            prefix.invalidate()
+            return self.request_completion(contents, config, prefix)
+        self.record_usage(estimated_tokens, completion)
+        return completion
+
+    async def arequest_completion(self, contents, config, prefix):
+        request_contents, request_config = self.context_caches.apply(prefix, contents, config)
+        estimated_tokens = estimate_tokens(request_contents)
+        await self.rate_limiter.aacquire(estimated_tokens)
+        try:
+            completion = await self.loop.arun(self.gemini_client.aio.models.generate_content(model=self.model, contents=request_contents, config=request_config))
+        except Exception as e:
+            # Only a missing or expired cache is worth inlining for, anything else goes to the retry policy as is.
+            if prefix is None or not prefix.is_cached() or not self.context_caches.is_cache_rejection(e):
+                raise
+            print("Cached context rejected, retrying with the prefix inlined...")
+            prefix.invalidate()
+            return await self.arequest_completion(contents, config, prefix)
+        self.record_usage(estimated_tokens, completion)
+        return completion
+
+    def complete(self, contents, config=None, parser=None, use_cache=True, prefix=None, operation="text", allow_truncated=True, validator=None):
+        key = self.cache_key(contents, config, prefix) if use_cache else None
+        call = self.telemetry.start(self.caller, operation)
+
+        def attempt():
+            call.attempts += 1
+            text = self.cached_text(key, use_cache)
+            fresh = text is None
+            call.cached = not fresh
+            if fresh:
+                completion = self.request_completion(contents, config, prefix)
+                call.add_usage(completion)
+                self.check_truncation(call, completion, allow_truncated)
+                text = completion.text
+            output = self.apply_parser(call, parser, text, validator)
+            # Repaired output was cut off mid-response, serving it from cache would repeat the truncation.
+            if fresh and use_cache and call.parse_outcome != REPAIRED:
+                self.cache.set(key, text)
+            return output
+
+        try:
+            output = self.retry_policy.call(attempt)
+        except Exception as e:
+            call.finish(e)
+            raise
+        call.finish()
+        return output
+
+    async def acomplete(self, contents, config=None, parser=None, use_cache=True, prefix=None, operation="text", allow_truncated=True, validator=None):
+        key = self.cache_key(contents, config, prefix) if use_cache else None
+        call = self.telemetry.start(self.caller, operation)
+
+        async def attempt():
+            call.attempts += 1
+            text = self.cached_text(key, use_cache)
+            fresh = text is None
+            call.cached = not fresh
+            if fresh:
+                completion = await self.arequest_completion(contents, config, prefix)
+                call.add_usage(completion)
+                self.check_truncation(call, completion, allow_truncated)
+                text = completion.text
+            output = self.apply_parser(call, parser, text, validator)
+            # Repaired output was cut off mid-response, serving it from cache would repeat the truncation.
+            if fresh and use_cache and call.parse_outcome != REPAIRED:
+                self.cache.set(key, text)
+            return output
+
+        try:
+            output = await self.retry_policy.acall(attempt)
+        except Exception as e:
+            call.finish(e)
+            raise
+        call.finish()
+        return output
+
+    def apply_parser(self, call, parser, text, validator=None):
+        if parser is None:
+            return text
+        try:
+            if parser is self.json_parser:
+                output, strategy = parser.parse_with_strategy(text)
+            else:
+                output, strategy = parser(text), None
+            # A repair only drops the cut-off tail, so it is kept when what survived still has the requested shape.
+            if strategy == REPAIRED and (validator is None or not validator(output)):
+                raise ResponseParseError("Repaired output of a truncated response is incomplete")
+        except Exception:
+            call.parse_outcome = "failed"
+            raise
+        call.parse_outcome = REPAIRED if strategy == REPAIRED else "parsed"
         return output
 
-    def generate_json_response(self, prompt, response_schema=None, markdown=False, file=None):
-        while True:
-            try:
-                if markdown:
-                    generation_config= types.GenerateContentConfig()
-                elif response_schema is None:
-                    generation_config= types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                        temperature=0.5
-                    )
-                else:
-                    generation_config= types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                        response_schema = response_schema,
-                        temperature=0.5
-                    )
-                if file is not None:
-                    completion = self.gemini_client.models.generate_content(
-                        model = self.model,
-                        contents=[types.Part.from_uri(file_uri=file.uri, mime_type=file.mime_type), prompt],
-                        config=generation_config,
-                    )
-                else:
-                    completion = self.gemini_client.models.generate_content(
-                        model=self.model,
-                        contents=prompt,
-                        config=generation_config,
-                    )
-                if markdown:
-                    return completion.text
-                output = ast.literal_eval(completion.text)
-                return output
-            except Exception as e:
-                print("Invalid JSON response, retrying in 10 seconds...")
-                time.sleep(3)
-
-    def upload_file(self, file_path, mime_type="video/mp4"):
+    def generate_response(self, prompt, remove_literals=False, use_cache=True):
+        parser = self.json_parser if remove_literals else None
+        return self.complete(prompt, parser=parser, use_cache=use_cache)
+
+    def generate_json_response(self, prompt, response_schema=None, markdown=False, file=None, use_cache=True, prefix=None, allow_truncated=True, validator=None):
+        generation_config = self.build_generation_config(response_schema, markdown)
+        contents = self.build_contents(prompt, file)
+        parser = None if markdown else self.json_parser
+        return self.complete(contents, config=generation_config, parser=parser, use_cache=use_cache, prefix=prefix, operation="json", allow_truncated=allow_truncated, validator=validator)
+
+    async def agenerate_response(self, prompt, remove_literals=False, use_cache=True):
+        parser = self.json_parser if remove_literals else None
+        return await self.acomplete(prompt, parser=parser, use_cache=use_cache)
+
+    async def agenerate_json_response(self, prompt, response_schema=None, markdown=False, file=None, use_cache=True, prefix=None, allow_truncated=True, validator=None):
+        generation_config = self.build_generation_config(response_schema, markdown)
+        contents = self.build_contents(prompt, file)
+        parser = None if markdown else self.json_parser
+        return await self.acomplete(contents, config=generation_config, parser=parser, use_cache=use_cache, prefix=prefix, operation="json", allow_truncated=allow_truncated, validator=validator)
+
+    def upload_file(self, file_path, mime_type="video/mp4", reuse=True):
+        content_hash = self.file_registry.hash_file(file_path, mime_type)
+        if reuse:
+            file = self.file_registry.get(content_hash)
+            if file is not None:
+                print(f"Reusing uploaded file: {file.uri}")
+                return file
         print("Uploading file...")
         file = self.gemini_client.files.upload(path=file_path, config={"mime_type": mime_type})
         print(f"Completed upload: {file.uri}.\nProcessing file...")
+        started_at = time.monotonic()
+        delay = 0.5
         while file.state == "PROCESSING":
-            print('.', end='')
-            time.sleep(1)
+            if time.monotonic() - started_at > GEMINI_FILE_PROCESSING_TIMEOUT:
+                self.file_registry.schedule_delete(self.gemini_client, file)
+                raise TimeoutError(f"File {file.name} was still processing after {GEMINI_FILE_PROCESSING_TIMEOUT} seconds")
+            time.sleep(delay)
+            delay = min(delay * 2, 8)
             file = self.gemini_client.files.get(name=file.name)
         if file.state == "FAILED":
+            self.file_registry.schedule_delete(self.gemini_client, file)
             raise ValueError(file.state)
         print(f"\nFile processing complete: {file.state}")
+        self.file_registry.put(content_hash, file, self.gemini_client)
         return file
     
+    async def aupload_file(self, file_path, mime_type="video/mp4", reuse=True):
+        content_hash = await asyncio.to_thread(self.file_registry.hash_file, file_path, mime_type)
+        if reuse:
+            file = self.file_registry.get(content_hash)
+            if file is not None:
+                print(f"Reusing uploaded file: {file.uri}")
+                return file
+        print("Uploading file...")
+        file = await self.loop.arun(self.gemini_client.aio.files.upload(path=file_path, config={"mime_type": mime_type}))
+        print(f"Completed upload: {file.uri}.\nProcessing file...")
+        try:
+            file = await asyncio.wait_for(self.await_file_processing(file), timeout=GEMINI_FILE_PROCESSING_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.file_registry.schedule_delete(self.gemini_client, file)
+            raise TimeoutError(f"File {file.name} was still processing after {GEMINI_FILE_PROCESSING_TIMEOUT} seconds")
+        if file.state == "FAILED":
+            self.file_registry.schedule_delete(self.gemini_client, file)
+            raise ValueError(file.state)
+        print(f"\nFile processing complete: {file.state}")
+        self.file_registry.put(content_hash, file, self.gemini_client)
+        return file
+
+    async def await_file_processing(self, file):
+        delay = 0.5
+        while file.state == "PROCESSING":
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 8)
+            file = await self.loop.arun(self.gemini_client.aio.files.get(name=file.name))
+        return file
+
     def delete_file(self, file):
-        print("Deleting file...")
-        return self.gemini_client.files.delete(name=file.name)
+        print("Scheduling file deletion...")
+        self.file_registry.forget(file)
+        self.file_registry.schedule_delete(self.gemini_client, file)
     
-    def explain_two_image(self, prompt, image1_path, image2_path):
-        with open(image1_path, 'rb') as f:
-            image1_bytes = f.read()
-        with open(image2_path, 'rb') as f:
-            image2_bytes = f.read()
-
-        mime_type1 = "image/" + os.path.splitext(image1_path)[1][1:]
-        mime_type2 = "image/" + os.path.splitext(image2_path)[1][1:]
-
-        completion = self.gemini_client.models.generate_content(
-            model= "gemini-1.5-flash",
-            contents=[prompt, types.Part.from_bytes(data=image1_bytes, mime_type=mime_type1 ), types.Part.from_bytes(data=image2_bytes, mime_type=mime_type2 ), prompt],
+    def image_contents(self, prompt, payloads):
+        return [prompt] + [types.Part.from_bytes(data=data, mime_type=mime_type) for data, mime_type, _ in payloads]
+
+    def explain_two_image(self, prompt, image1_path, image2_path, subject=None, use_cache=True):
+        payloads = [self.image_optimizer.prepare(image1_path), self.image_optimizer.prepare(image2_path)]
+        key = ResponseCache.make_key(self.model, [payload[2] for payload in payloads], subject or prompt)
+        explanation = self.explanation_cache.get(key) if use_cache else None
+        if explanation is not None:
+            return explanation
+        explanation = self.complete(self.image_contents(prompt, payloads), use_cache=False, operation="image_explanation")
+        if use_cache:
+            self.explanation_cache.set(key, explanation)
+        return explanation
+
+    async def aexplain_two_image(self, prompt, image1_path, image2_path, subject=None, use_cache=True):
+        payloads = await asyncio.gather(
+            asyncio.to_thread(self.image_optimizer.prepare, image1_path),
+            asyncio.to_thread(self.image_optimizer.prepare, image2_path),
         )
-        return completion.text
+        key = ResponseCache.make_key(self.model, [payload[2] for payload in payloads], subject or prompt)
+        explanation = self.explanation_cache.get(key) if use_cache else None
+        if explanation is not None:
+            return explanation
+        explanation = await self.acomplete(self.image_contents(prompt, payloads), use_cache=False, operation="image_explanation")
+        if use_cache:
+            self.explanation_cache.set(key, explanation)
+        return explanation
     
     def initialize_assistant(self, profile, tools):
         self.chat = self.gemini_client.chats.create(
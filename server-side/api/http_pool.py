@@ -0,0 +1,41 @@
+import asyncio
+import httpx
+from api.background_loop import BackgroundLoop
+
+class PooledHTTPClient:
+    """One keep-alive httpx.AsyncClient on a dedicated event loop, shared by sync and async callers."""
+
+    def __init__(self, name="http", timeout=15.0, max_connections=20, max_concurrency=8):
+        self.name = name
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.loop = BackgroundLoop(name=f"{name}-http")
+        self.client = None
+        self.semaphore = None
+
+    def ensure_client(self):
+        # Only ever called on the pool's loop thread, so the client and semaphore are created once and bound to it.
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def send(self, method, url, timeout=None, **kwargs):
+        self.ensure_client()
+        async with self.semaphore:
+            response = await self.client.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def request(self, method, url, **kwargs):
+        return await self.loop.arun(self.send(method, url, **kwargs))
+
+    def request_sync(self, method, url, **kwargs):
+        return self.loop.run(self.send(method, url, **kwargs))
+
+    def run(self, coroutine):
+        # Runs a whole fan-out on the pool's loop so every request in it reuses the same connections.
+        return self.loop.run(coroutine)
@@ -0,0 +1,82 @@
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+PIL_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+    "TIFF": "image/tiff",
+}
+
+class ImagePayloadOptimizer:
+    """Downsizes and re-encodes images before they are sent inline to Gemini."""
+
+    def __init__(self, max_edge=1024, quality=85, max_entries=256):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "optimized": 0, "passthrough": 0, "original_bytes": 0, "sent_bytes": 0}
+
+    def prepare(self, image_path):
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return payload
+        with open(image_path, "rb") as f:
+            raw = f.read()
+        payload = self.optimize(raw)
+        with self.lock:
+            self.entries[key] = payload
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return payload
+
+    def optimize(self, raw):
+        content_hash = hashlib.sha256(raw).hexdigest()
+        with Image.open(io.BytesIO(raw)) as image:
+            source_format = image.format
+            mime_type = PIL_MIME_TYPES.get(source_format)
+            # Small images in a format Gemini accepts are already cheap to send as they are.
+            if mime_type in ("image/jpeg", "image/png", "image/webp") and max(image.size) <= self.max_edge:
+                self.record(len(raw), len(raw), optimized=False)
+                return raw, mime_type, content_hash
+            resized = max(image.size) > self.max_edge
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                image.save(buffer, format="PNG", optimize=True)
+                mime_type = "image/png"
+            else:
+                image.convert("RGB").save(buffer, format="JPEG", quality=self.quality, optimize=True)
+                mime_type = "image/jpeg"
+        data = buffer.getvalue()
+        # Only a re-encode of an image that was already within max_edge may lose to the original bytes.
+        if not resized and len(data) >= len(raw) and PIL_MIME_TYPES.get(source_format) in ("image/jpeg", "image/png", "image/webp"):
+            self.record(len(raw), len(raw), optimized=False)
+            return raw, PIL_MIME_TYPES[source_format], content_hash
+        self.record(len(raw), len(data), optimized=True)
+        return data, mime_type, content_hash
+
+    def record(self, original_bytes, sent_bytes, optimized):
+        with self.lock:
+            self.stats["optimized" if optimized else "passthrough"] += 1
+            self.stats["original_bytes"] += original_bytes
+            self.stats["sent_bytes"] += sent_bytes
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        return stats
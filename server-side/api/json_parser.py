@@ -0,0 +1,208 @@
+import re
+import ast
+import json
+import threading
+from api.retry_policy import ResponseParseError
+
+STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'', re.DOTALL)
+FENCE_PATTERN = re.compile(r"```[a-zA-Z0-9_-]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+REPAIRED = "repaired"
+
+class JSONSalvageParser:
+    """Parses LLM output as JSON, falling back to progressively more forgiving strategies."""
+
+    def __init__(self, max_repair_cuts=64):
+        self.max_repair_cuts = max_repair_cuts
+        self.strategies = [
+            ("strict", self.parse_strict),
+            ("fenced", self.parse_fenced),
+            ("relaxed", self.parse_relaxed),
+            ("literal", self.parse_literal),
+            (REPAIRED, self.parse_repaired),
+        ]
+        self.lock = threading.Lock()
+        self.stats = {name: 0 for name, _ in self.strategies}
+        self.stats["failed"] = 0
+
+    def parse(self, text):
+        return self.parse_with_strategy(text)[0]
+
+    def parse_with_strategy(self, text):
+        if text is None:
+            self.record("failed")
+            raise ResponseParseError("Model returned an empty response")
+        for name, strategy in self.strategies:
+            try:
+                output = strategy(text)
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                continue
+            self.record(name)
+            return output, name
+        self.record("failed")
+        raise ResponseParseError(f"Could not salvage JSON from model output: {text[:200]!r}")
+
+    def record(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def parse_strict(self, text):
+        return json.loads(text, strict=False)
+
+    def parse_fenced(self, text):
+        return json.loads(self.extract_payload(text), strict=False)
+
+    def parse_relaxed(self, text):
+        return json.loads(self.relax(self.extract_payload(text)), strict=False)
+
+    def parse_literal(self, text):
+        payload = self.extract_payload(text)
+        try:
+            return ast.literal_eval(payload)
+        except (ValueError, SyntaxError):
+            skeleton, strings = self.mask_strings(payload)
+            skeleton = re.sub(r"\btrue\b", "True", skeleton)
+            skeleton = re.sub(r"\bfalse\b", "False", skeleton)
+            skeleton = re.sub(r"\bnull\b", "None", skeleton)
+            return ast.literal_eval(self.unmask_strings(skeleton, strings))
+
+    def parse_repaired(self, text):
+        payload = self.relax(self.extract_payload(text, allow_unbalanced=True))
+        cuts = self.cut_positions(payload)
+        for cut in cuts[:self.max_repair_cuts]:
+            candidate = self.close_truncated(payload[:cut])
+            if not candidate:
+                continue
+            try:
+                return json.loads(candidate, strict=False)
+            except ValueError:
+                continue
+        raise ValueError("Truncated output could not be repaired")
+
+    def extract_payload(self, text, allow_unbalanced=False):
+        text = text.strip()
+        fence = FENCE_PATTERN.search(text)
+        if fence:
+            text = fence.group(1).strip()
+        starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+        if not starts:
+            return text
+        start = min(starts)
+        end = self.matching_close(text, start)
+        if end is None:
+            return text[start:] if allow_unbalanced else text[start:].rstrip("`").strip()
+        return text[start:end + 1]
+
+    def matching_close(self, text, start):
+        depth = 0
+        in_string = None
+        escape = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == in_string:
+                    in_string = None
+                continue
+            if char in "\"'":
+                in_string = char
+            elif char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+                if depth == 0:
+                    return index
+        return None
+
+    def mask_strings(self, text):
+        strings = []
+
+        def replace(match):
+            strings.append(match.group(0))
+            return f"\x00{len(strings) - 1}\x00"
+
+        return STRING_PATTERN.sub(replace, text), strings
+
+    def unmask_strings(self, skeleton, strings):
+        return re.sub(r"\x00(\d+)\x00", lambda match: strings[int(match.group(1))], skeleton)
+
+    def relax(self, text):
+        skeleton, strings = self.mask_strings(text)
+        skeleton = re.sub(r"//[^\n]*", "", skeleton)
+        skeleton = re.sub(r"/\*.*?\*/", "", skeleton, flags=re.DOTALL)
+        skeleton = re.sub(r",(\s*[}\]])", r"\1", skeleton)
+        skeleton = re.sub(r"([{,]\s*)([A-Za-z_][\w\-]*)(\s*:)", r'\1"\2"\3', skeleton)
+        skeleton = re.sub(r"\bTrue\b", "true", skeleton)
+        skeleton = re.sub(r"\bFalse\b", "false", skeleton)
+        skeleton = re.sub(r"\bNone\b", "null", skeleton)
+        strings = [self.to_double_quoted(string) for string in strings]
+        return self.unmask_strings(skeleton, strings)
+
+    def to_double_quoted(self, string):
+        if string.startswith('"'):
+            return string
+        body = string[1:-1].replace("\\'", "'").replace('"', '\\"')
+        return f'"{body}"'
+
+    def cut_positions(self, text):
+        positions = [len(text)]
+        in_string = False
+        escape = False
+        for index, char in enumerate(text):
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+                continue
+            if char == '"':
+                in_string = True
+            elif char == ",":
+                positions.append(index)
+            elif char in "{[":
+                positions.append(index + 1)
+        return [positions[0]] + sorted(set(positions[1:]), reverse=True)
+
+    def close_truncated(self, prefix):
+        stack = []
+        in_string = False
+        escape = False
+        for char in prefix:
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+                continue
+            if char == '"':
+                in_string = True
+            elif char == "{":
+                stack.append("}")
+            elif char == "[":
+                stack.append("]")
+            elif char in "}]" and stack:
+                stack.pop()
+        # A cut inside a string would turn half a value into a complete one, let an earlier cut drop the member instead.
+        if in_string:
+            return ""
+        candidate = prefix.rstrip()
+        while candidate and candidate[-1] in ",:":
+            candidate = candidate[:-1].rstrip()
+        if not candidate:
+            return ""
+        # Likewise a container opened just before the cut is a truncated member, not an empty one.
+        if candidate[-1] in "{[" and len(stack) > 1:
+            return ""
+        return candidate + "".join(reversed(stack))
+
+JSON_SALVAGE_PARSER = JSONSalvageParser()
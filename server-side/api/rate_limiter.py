@@ -0,0 +1,86 @@
+import time
+import asyncio
+import threading
+from api.token_counter import count_tokens
+
+IMAGE_TOKEN_ESTIMATE = 258
+FILE_TOKEN_ESTIMATE = 8000
+
+def estimate_tokens(contents):
+    if contents is None:
+        return 0
+    if isinstance(contents, str):
+        return count_tokens(contents)
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    text = getattr(contents, "text", None)
+    if isinstance(text, str):
+        return estimate_tokens(text)
+    if getattr(contents, "inline_data", None) is not None:
+        return IMAGE_TOKEN_ESTIMATE
+    if getattr(contents, "file_data", None) is not None:
+        return FILE_TOKEN_ESTIMATE
+    return estimate_tokens(str(contents))
+
+class RateLimiter:
+    """Process-wide token bucket pacing requests per minute and estimated tokens per minute."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, name="gemini"):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_balance = float(requests_per_minute)
+        self.token_balance = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "estimated_tokens": 0, "actual_tokens": 0, "throttled": 0, "total_wait": 0.0}
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.request_balance = min(self.requests_per_minute, self.request_balance + elapsed * self.request_rate)
+        self.token_balance = min(self.tokens_per_minute, self.token_balance + elapsed * self.token_rate)
+
+    def reserve(self, tokens=0):
+        tokens = min(tokens, self.tokens_per_minute)
+        with self.lock:
+            self.refill(time.monotonic())
+            self.request_balance -= 1
+            self.token_balance -= tokens
+            wait = max(0.0, -self.request_balance / self.request_rate, -self.token_balance / self.token_rate)
+            self.stats["requests"] += 1
+            self.stats["estimated_tokens"] += tokens
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["total_wait"] += wait
+        return wait
+
+    def acquire(self, tokens=0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens=0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if actual_tokens is None:
+            return
+        with self.lock:
+            self.refill(time.monotonic())
+            self.token_balance += min(estimated_tokens, self.tokens_per_minute) - actual_tokens
+            self.stats["actual_tokens"] += actual_tokens
+
+    def get_stats(self):
+        with self.lock:
+            self.refill(time.monotonic())
+            stats = dict(self.stats)
+            stats["available_requests"] = self.request_balance
+            stats["available_tokens"] = self.token_balance
+        return stats
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(__file__), 'response-cache', 'responses.db'))
+
+class ResponseCache:
+    """Two tier (in-memory LRU + sqlite) cache for JSON serialisable responses."""
+
+    def __init__(self, namespace, db_path=DEFAULT_CACHE_PATH, ttl=86400, max_memory_entries=512, max_disk_entries=20000, persistent=True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "bypassed": 0}
+        self.connection = None
+        if persistent and db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.connection = sqlite3.connect(db_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        def default(obj):
+            if hasattr(obj, "model_dump"):
+                return obj.model_dump(mode="json", exclude_none=True)
+            if isinstance(obj, (bytes, bytearray)):
+                return hashlib.sha256(obj).hexdigest()
+            if isinstance(obj, type):
+                return f"{obj.__module__}.{obj.__qualname__}"
+            return str(obj)
+        serialized = json.dumps(parts, sort_keys=True, default=default)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return json.loads(value)
+                del self.memory[key]
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at > now:
+                        self.connection.execute(
+                            "UPDATE response_cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                            (now, self.namespace, key),
+                        )
+                        self.connection.commit()
+                        self._remember(key, value, expires_at)
+                        self.stats["disk_hits"] += 1
+                        return json.loads(value)
+                    self.connection.execute("DELETE FROM response_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    self.connection.commit()
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        serialized = json.dumps(value)
+        with self.lock:
+            self._remember(key, serialized, expires_at)
+            self.stats["sets"] += 1
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO response_cache (namespace, key, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, serialized, expires_at, now),
+                )
+                self._evict_disk(now)
+                self.connection.commit()
+
+    def record_bypass(self):
+        with self.lock:
+            self.stats["bypassed"] += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.memory.pop(key, None)
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM response_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM response_cache WHERE namespace = ?", (self.namespace,))
+                self.connection.commit()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+    def _remember(self, key, serialized, expires_at):
+        self.memory[key] = (serialized, expires_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        self.connection.execute("DELETE FROM response_cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+        count = self.connection.execute("SELECT COUNT(*) FROM response_cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self.connection.execute(
+                "DELETE FROM response_cache WHERE namespace = ? AND key IN ("
+                "SELECT key FROM response_cache WHERE namespace = ? ORDER BY last_access ASC LIMIT ?)",
+                (self.namespace, self.namespace, overflow),
+            )
+            self.stats["evictions"] += overflow
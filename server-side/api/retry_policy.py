@@ -0,0 +1,125 @@
+import re
+import time
+import random
+import asyncio
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+PARSE = "parse"
+FATAL = "fatal"
+
+RATE_LIMIT_MARKERS = ("RESOURCE_EXHAUSTED", "rate limit", "quota", "Too Many Requests")
+FATAL_MARKERS = ("PERMISSION_DENIED", "UNAUTHENTICATED", "INVALID_ARGUMENT", "NOT_FOUND", "API key not valid")
+
+class LLMRequestError(Exception):
+    def __init__(self, message, category=None, attempts=0, last_error=None):
+        super().__init__(message)
+        self.category = category
+        self.attempts = attempts
+        self.last_error = last_error
+
+class RetryBudgetExhausted(LLMRequestError):
+    pass
+
+class NonRetryableError(LLMRequestError):
+    pass
+
+class ResponseTruncated(LLMRequestError):
+    pass
+
+class ResponseParseError(ValueError):
+    pass
+
+def classify_error(error):
+    if isinstance(error, (ResponseParseError, SyntaxError, ValueError)) and not hasattr(error, "code"):
+        return PARSE
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        if code == 429:
+            return RATE_LIMIT
+        if code in (408, 409) or code >= 500:
+            return TRANSIENT
+        if 400 <= code < 500:
+            return FATAL
+    message = str(error)
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return RATE_LIMIT
+    if any(marker in message for marker in FATAL_MARKERS):
+        return FATAL
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    error_names = [cls.__name__ for cls in type(error).__mro__]
+    if any("Timeout" in name or "Connect" in name or "Network" in name for name in error_names):
+        return TRANSIENT
+    # Unknown failures are retried, the attempt limit and deadline still bound them.
+    return TRANSIENT
+
+def retry_after_hint(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    details = getattr(error, "details", None)
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(details) + str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=30.0, deadline=120.0, retry_on=(RATE_LIMIT, TRANSIENT, PARSE), name="gemini"):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.name = name
+
+    def compute_delay(self, attempt, error, category):
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(backoff / 2, backoff)
+        hint = retry_after_hint(error)
+        if hint is not None:
+            delay = max(delay, hint)
+        return delay
+
+    def next_delay(self, attempt, error, started_at):
+        category = classify_error(error)
+        if category not in self.retry_on:
+            raise NonRetryableError(f"{self.name} request failed with a {category} error: {error}", category=category, attempts=attempt, last_error=error) from error
+        if attempt >= self.max_attempts:
+            raise RetryBudgetExhausted(f"{self.name} request failed after {attempt} attempts: {error}", category=category, attempts=attempt, last_error=error) from error
+        delay = self.compute_delay(attempt, error, category)
+        remaining = self.deadline - (time.monotonic() - started_at)
+        if delay >= remaining:
+            raise RetryBudgetExhausted(f"{self.name} request exceeded its {self.deadline}s deadline after {attempt} attempts: {error}", category=category, attempts=attempt, last_error=error) from error
+        print(f"{self.name} request failed ({category}): {error}. Retrying in {delay:.1f} seconds (attempt {attempt}/{self.max_attempts})...")
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except LLMRequestError:
+                raise
+            except Exception as e:
+                time.sleep(self.next_delay(attempt, e, started_at))
+
+    async def acall(self, func, *args, **kwargs):
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except LLMRequestError:
+                raise
+            except Exception as e:
+                await asyncio.sleep(self.next_delay(attempt, e, started_at))
@@ -1,125 +1,205 @@
 import json
 import os
-import requests
+import re
+import asyncio
+import httpx
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
+from api.http_pool import PooledHTTPClient
+from api.response_cache import ResponseCache
 
 load_dotenv()
 serper_api_key = os.getenv('SERPER_API_KEY')
 google_serp_api_key = os.getenv('GOOGLE_SERP_API_KEY')
+serper_base_url = os.getenv('SERPER_BASE_URL', 'https://google.serper.dev')
+serpapi_base_url = os.getenv('SERPAPI_BASE_URL', 'https://serpapi.com')
+
+SEARCH_HTTP = PooledHTTPClient(
+    name="search",
+    timeout=float(os.getenv("SEARCH_HTTP_TIMEOUT", 15)),
+    max_connections=int(os.getenv("SEARCH_HTTP_MAX_CONNECTIONS", 20)),
+    max_concurrency=int(os.getenv("SEARCH_HTTP_CONCURRENCY", 8)),
+)
+
+MEDIA_SEARCH_CACHE = ResponseCache(
+    namespace="media_search",
+    ttl=int(os.getenv("MEDIA_SEARCH_CACHE_TTL", 7 * 24 * 3600)),
+    max_memory_entries=int(os.getenv("MEDIA_SEARCH_CACHE_MEMORY_ENTRIES", 1024)),
+    persistent=os.getenv("MEDIA_SEARCH_CACHE_PERSISTENT", "true") == "true",
+)
+COURSE_SEARCH_CACHE = ResponseCache(
+    namespace="course_search",
+    ttl=int(os.getenv("COURSE_SEARCH_CACHE_TTL", 3 * 24 * 3600)),
+    persistent=os.getenv("COURSE_SEARCH_CACHE_PERSISTENT", "true") == "true",
+)
+COURSE_SEARCH_WORKERS = int(os.getenv("COURSE_SEARCH_WORKERS", 5))
+IMAGES_PER_SUBMODULE = int(os.getenv("IMAGES_PER_SUBMODULE", 12))
+VIDEOS_PER_SUBMODULE = int(os.getenv("VIDEOS_PER_SUBMODULE", 10))
 
 class SerperProvider:
     @staticmethod
-    def module_image_from_web(submodules:dict):
-        print('FETCHING IMAGES...')
-        keys_list = list(submodules.keys())
-        url = "https://google.serper.dev/images"
+    def media_cache_key(kind, query):
+        return ResponseCache.make_key(kind, re.sub(r"\s+", " ", str(query)).strip().casefold())
+
+    @staticmethod
+    def dedupe_media(results : list, limit, seen=None):
+        seen = set() if seen is None else seen
+        deduped = []
+        for links in results:
+            kept = []
+            for link in links:
+                if len(kept) >= limit:
+                    break
+                if link not in seen:
+                    seen.add(link)
+                    kept.append(link)
+            deduped.append(kept)
+        return deduped
+
+    @staticmethod
+    async def aimage_search(query):
+        key = SerperProvider.media_cache_key("images", query)
+        cached = MEDIA_SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached
         headers = {
             'X-API-KEY': serper_api_key,
             'Content-Type': 'application/json'
         }
-        images_list=[]
-        for key in keys_list:
-            payload = json.dumps({
-                "q": submodules[key]
-            })
-            response = requests.request("POST", url, headers=headers, data=payload)
-            json_response = json.loads(response.text)
-            image_results = json_response["images"]
-            image_links = [i["imageUrl"] for i in image_results]
-            images_list.append(image_links)
+        try:
+            response = await SEARCH_HTTP.request("POST", f"{serper_base_url}/images", headers=headers, content=json.dumps({"q": query}))
+            image_links = [i["imageUrl"] for i in response.json().get("images", [])]
+        except (httpx.HTTPStatusError, httpx.RequestError, ValueError, KeyError) as e:
+            print(f"Error fetching images for {query}: {e}")
+            return []
+        MEDIA_SEARCH_CACHE.set(key, image_links)
+        return image_links
+
+    @staticmethod
+    async def avideo_search(query, n_videos=10):
+        key = SerperProvider.media_cache_key("videos", query)
+        cached = MEDIA_SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached[:n_videos]
+        params = {
+            "q": query,
+            "engine": "google_videos",
+            "ijn": "0",
+            "api_key": google_serp_api_key
+        }
+        try:
+            response = await SEARCH_HTTP.request("GET", f"{serpapi_base_url}/search", params=params)
+            # Cache the full result page so later calls asking for more videos still hit.
+            video_links = [i['link'] for i in response.json().get("video_results", [])]
+        except (httpx.HTTPStatusError, httpx.RequestError, ValueError, KeyError) as e:
+            print(f"Error fetching videos for {query}: {e}")
+            return []
+        MEDIA_SEARCH_CACHE.set(key, video_links)
+        return video_links[:n_videos]
+
+    @staticmethod
+    async def amodule_media_from_web(submodules : dict, images=True, videos=False):
+        queries = list(submodules.values())
+        image_tasks = [SerperProvider.aimage_search(query) for query in queries] if images else []
+        video_tasks = [SerperProvider.avideo_search(query) for query in queries] if videos else []
+        results = await asyncio.gather(*image_tasks, *video_tasks)
+        images_list = SerperProvider.dedupe_media(results[:len(image_tasks)], IMAGES_PER_SUBMODULE)
+        videos_list = SerperProvider.dedupe_media(results[len(image_tasks):], VIDEOS_PER_SUBMODULE)
+        return images_list, videos_list
+
+    @staticmethod
+    def module_media_from_web(submodules : dict, images=True, videos=False):
+        print('FETCHING IMAGES AND VIDEOS...')
+        return SEARCH_HTTP.run(SerperProvider.amodule_media_from_web(submodules, images=images, videos=videos))
+
+    @staticmethod
+    def module_image_from_web(submodules:dict):
+        print('FETCHING IMAGES...')
+        images_list, _ = SEARCH_HTTP.run(SerperProvider.amodule_media_from_web(submodules, images=True, videos=False))
         return images_list
     
     @staticmethod
-    async def submodule_image_from_web(submodule_name):
-        url = "https://google.serper.dev/images"
-        headers = {
-            'X-API-KEY': serper_api_key,
-            'Content-Type': 'application/json'
-        }
-        payload = json.dumps({
-            "q": submodule_name
-        })
-        response = requests.request("POST", url, headers=headers, data=payload)
-        json_response = json.loads(response.text)
-        image_results = json_response["images"]
-        image_links = [i["imageUrl"] for i in image_results]
-        return image_links
+    async def submodule_image_from_web(submodule_name, seen=None):
+        image_links = await SerperProvider.aimage_search(submodule_name)
+        return SerperProvider.dedupe_media([image_links], IMAGES_PER_SUBMODULE, seen)[0]
     
     @staticmethod
     def module_videos_from_web(submodules):
         print('FETCHING VIDEOS...')
-        keys_list = list(submodules.keys())
-        videos_list=[]
-        for key in keys_list:
-            params = {
-                "q": submodules[key],
-                "engine": "google_videos",
-                "ijn": "0",
-                "api_key": google_serp_api_key
-            }
-
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            video_results = results["video_results"]
-            yt_links = [i['link'] for i in video_results[:10]]
-            videos_list.append(yt_links)
+        _, videos_list = SEARCH_HTTP.run(SerperProvider.amodule_media_from_web(submodules, images=False, videos=True))
         return videos_list
     
     @staticmethod
     def search_videos_from_web(query : str, n_videos : int = 5):
+        return SEARCH_HTTP.run(SerperProvider.avideo_search(query, n_videos))
+
+    @staticmethod
+    def extract_course_links(search_results : dict):
+        """Extracts valid course links from inline sitelinks."""
+        trusted_sources = ["Coursera","edX", "Udacity", "upGrad", "FutureLearn", "Udemy", "Harvard University"]
+        course_links = []
+
+        if "organic_results" not in search_results:
+            return course_links
+        for result in search_results.get("organic_results", []):
+            source = result.get("source")
+            sitelinks = result.get("sitelinks", {}).get("inline", [])
+            if source in trusted_sources and sitelinks:
+                for sitelink in sitelinks:
+                    link = sitelink.get("link")
+                    if link :
+                        course_links.append({
+                            "source": source,
+                            "title": sitelink.get("title", "No Title"),
+                            "link": link
+                        })
+
+        return course_links
+
+    @staticmethod
+    async def acourse_search(skill, semaphore):
+        key = SerperProvider.media_cache_key("courses", skill)
+        cached = COURSE_SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached
         params = {
-            "q": query,
-            "engine": "google_videos",
-            "ijn": "0",
-            "api_key": google_serp_api_key
+            "q": f"Courses on {skill}",
+            "engine": "google",
+            "api_key": google_serp_api_key,
+            "location": "India"
         }
+        try:
+            async with semaphore:
+                response = await SEARCH_HTTP.request("GET", f"{serpapi_base_url}/search", params=params)
+            course_links = SerperProvider.extract_course_links(response.json())
+        except (httpx.HTTPStatusError, httpx.RequestError, ValueError) as e:
+            print(f"Error searching for {skill}: {e}")
+            return []
+        COURSE_SEARCH_CACHE.set(key, course_links)
+        return course_links
 
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        video_results = results["video_results"]
-        yt_links = [i['link'] for i in video_results[:n_videos]]
-        return yt_links
-
-    @staticmethod
-    def find_courses(skills : list):
-        
-        def extract_course_links(search_results : dict):
-            """Extracts valid course links from inline sitelinks."""
-            trusted_sources = ["Coursera","edX", "Udacity", "upGrad", "FutureLearn", "Udemy", "Harvard University"]
-            course_links = []
-
-            if "organic_results" not in search_results:
-                return course_links
-            for result in search_results.get("organic_results", []):
-                source = result.get("source")
-                sitelinks = result.get("sitelinks", {}).get("inline", [])
-                if source in trusted_sources and sitelinks:
-                    for sitelink in sitelinks:
-                        link = sitelink.get("link")
-                        if link :
-                            course_links.append({
-                                "source": source,
-                                "title": sitelink.get("title", "No Title"),
-                                "link": link
-                            })
+    @staticmethod
+    async def afind_courses_by_skill(skills : list, max_workers=COURSE_SEARCH_WORKERS):
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+        results = await asyncio.gather(*[SerperProvider.acourse_search(skill, semaphore) for skill in skills])
+        return dict(zip(skills, results))
 
-            return course_links
-        
+    @staticmethod
+    async def afind_courses(skills : list, max_workers=COURSE_SEARCH_WORKERS):
+        # Same list of {source, title, link} callers always got, now covering every skill instead of only the last one.
+        courses_by_skill = await SerperProvider.afind_courses_by_skill(skills, max_workers)
         course_links = []
+        seen = set()
         for skill in skills:
-            params = {
-                "q": f"Courses on {skill}",
-                "engine": "google",
-                "api_key": google_serp_api_key,
-                "location": "India"
-            }
-            try:
-                search = GoogleSearch(params)
-                results = search.get_dict()
-                extracted_links = extract_course_links(results)
-                if extracted_links:
-                    course_links = extracted_links
-            except Exception as e:
-                print(f"Error searching for {skill}: {e}")
-        return course_links
\ No newline at end of file
+            for course in courses_by_skill[skill]:
+                if course["link"] not in seen:
+                    seen.add(course["link"])
+                    course_links.append(course)
+        return course_links
+
+    @staticmethod
+    def find_courses(skills : list, max_workers=COURSE_SEARCH_WORKERS):
+        return SEARCH_HTTP.run(SerperProvider.afind_courses(list(skills), max_workers))
+
+    @staticmethod
+    def find_courses_by_skill(skills : list, max_workers=COURSE_SEARCH_WORKERS):
+        return SEARCH_HTTP.run(SerperProvider.afind_courses_by_skill(list(skills), max_workers))
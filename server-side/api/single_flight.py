@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """Coalesces concurrent identical calls so only the first caller does the work."""
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.async_in_flight = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+            self.stats["leaders" if leader else "coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    async def ado(self, key, func, *args, **kwargs):
+        # asyncio futures belong to one loop, so async callers are only coalesced within their own loop.
+        flight_key = (id(asyncio.get_running_loop()), key)
+        with self.lock:
+            future = self.async_in_flight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = asyncio.get_running_loop().create_future()
+                self.async_in_flight[flight_key] = future
+            self.stats["leaders" if leader else "coalesced"] += 1
+        if not leader:
+            return await asyncio.shield(future)
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                self.async_in_flight.pop(flight_key, None)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self.in_flight) + len(self.async_in_flight)
+        return stats
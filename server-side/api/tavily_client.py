@@ -1,22 +1,139 @@
 import os
+import re
+import json
+import threading
 from dotenv import load_dotenv
-from tavily import TavilyClient, AsyncTavilyClient
+from api.response_cache import ResponseCache
+from api.single_flight import SingleFlight
+from api.tavily_key_pool import TAVILY_KEY_POOL, SEARCH_DEPTH_CREDITS
+from api.rate_limiter import estimate_tokens
 
 load_dotenv()
-tavily_api_key1 = os.getenv('TAVILY_API_KEY1')
-tavily_api_key2 = os.getenv('TAVILY_API_KEY2')
-tavily_api_key3 = os.getenv('TAVILY_API_KEY3')
+
+TAVILY_SEARCH_CACHE = ResponseCache(
+    namespace="tavily",
+    ttl=int(os.getenv("TAVILY_CACHE_TTL", 24 * 3600)),
+    max_memory_entries=int(os.getenv("TAVILY_CACHE_MEMORY_ENTRIES", 1024)),
+    max_disk_entries=int(os.getenv("TAVILY_CACHE_DISK_ENTRIES", 20000)),
+    persistent=os.getenv("TAVILY_CACHE_PERSISTENT", "true") == "true",
+)
+TAVILY_SEARCH_FLIGHTS = SingleFlight(name="tavily")
+
+ADAPTIVE_DEPTH = "adaptive"
+TAVILY_ADAPTIVE_MIN_SCORE = float(os.getenv("TAVILY_ADAPTIVE_MIN_SCORE", 0.5))
+TAVILY_ADAPTIVE_MIN_RESULTS = int(os.getenv("TAVILY_ADAPTIVE_MIN_RESULTS", 3))
+TAVILY_ADAPTIVE_MIN_CHARS = int(os.getenv("TAVILY_ADAPTIVE_MIN_CHARS", 1500))
+TAVILY_ADAPTIVE_MAX_RESULTS = int(os.getenv("TAVILY_ADAPTIVE_MAX_RESULTS", 5))
+TAVILY_DEPTH_STATS = {"adaptive": 0, "escalated": 0}
+TAVILY_DEPTH_STATS_LOCK = threading.Lock()
 
 class TavilyProvider:
-    def __init__(self, flag=1):
-        active_api = tavily_api_key1 if flag==1 else(tavily_api_key2 if flag==2 else tavily_api_key3)
-        self.tavily_client = TavilyClient(api_key = active_api)
-        self.async_tavily_client = AsyncTavilyClient(api_key=active_api)
+    def __init__(self, cache=None, key_pool=None):
+        self.key_pool = key_pool if key_pool is not None else TAVILY_KEY_POOL
+        self.cache = cache if cache is not None else TAVILY_SEARCH_CACHE
+        self.flights = TAVILY_SEARCH_FLIGHTS
+
+    @staticmethod
+    def normalize_query(topic):
+        query = re.sub(r"\s+", " ", str(topic)).strip().casefold()
+        query = re.sub(r"\s*:\s*", " : ", query)
+        return query.strip(" .?!")
+
+    def cache_key(self, topic, search_depth, max_tokens):
+        return ResponseCache.make_key("search_context", self.normalize_query(topic), search_depth, max_tokens)
 
-    def search_context(self, topic, search_depth="advanced", max_tokens=4000):
-        search_results = self.tavily_client.get_search_context(topic, search_depth=search_depth, max_tokens=max_tokens)
+    def search_context(self, topic, search_depth="advanced", max_tokens=4000, use_cache=True):
+        if not use_cache:
+            self.cache.record_bypass()
+            return self.request_search_context(topic, search_depth, max_tokens)
+        key = self.cache_key(topic, search_depth, max_tokens)
+        search_results = self.cache.get(key)
+        if search_results is not None:
+            return search_results
+        return self.flights.do(key, self.fetch_search_context, key, topic, search_depth, max_tokens)
+
+    def fetch_search_context(self, key, topic, search_depth, max_tokens):
+        search_results = self.request_search_context(topic, search_depth, max_tokens)
+        self.cache.set(key, search_results)
         return search_results
     
-    async def asearch_context(self, topic, search_depth="advanced", max_tokens=4000):
-        search_results = await self.async_tavily_client.get_search_context(topic, search_depth=search_depth, max_tokens=max_tokens)
-        return search_results
\ No newline at end of file
+    async def asearch_context(self, topic, search_depth="advanced", max_tokens=4000, use_cache=True):
+        if not use_cache:
+            self.cache.record_bypass()
+            return await self.arequest_search_context(topic, search_depth, max_tokens)
+        key = self.cache_key(topic, search_depth, max_tokens)
+        search_results = self.cache.get(key)
+        if search_results is not None:
+            return search_results
+        return await self.flights.ado(key, self.afetch_search_context, key, topic, search_depth, max_tokens)
+
+    async def afetch_search_context(self, key, topic, search_depth, max_tokens):
+        search_results = await self.arequest_search_context(topic, search_depth, max_tokens)
+        self.cache.set(key, search_results)
+        return search_results
+
+    def basic_context(self, response, max_tokens):
+        results = [result for result in response.get("results", []) if result.get("score", 0) >= TAVILY_ADAPTIVE_MIN_SCORE]
+        if len(results) < TAVILY_ADAPTIVE_MIN_RESULTS or sum(len(result.get("content", "")) for result in results) < TAVILY_ADAPTIVE_MIN_CHARS:
+            return None
+        context = []
+        for result in results:
+            item = {"url": result.get("url"), "content": result.get("content", "")}
+            if context and estimate_tokens(json.dumps(context + [item])) > max_tokens:
+                break
+            context.append(item)
+        return json.dumps(context)
+
+    def record_depth(self, escalated):
+        with TAVILY_DEPTH_STATS_LOCK:
+            TAVILY_DEPTH_STATS["adaptive"] += 1
+            TAVILY_DEPTH_STATS["escalated"] += int(escalated)
+
+    def adaptive_search_context(self, topic, max_tokens):
+        response = self.key_pool.call(
+            lambda client: client.search(topic, search_depth="basic", max_results=TAVILY_ADAPTIVE_MAX_RESULTS),
+            credits=SEARCH_DEPTH_CREDITS["basic"],
+        )
+        context = self.basic_context(response, max_tokens)
+        self.record_depth(escalated=context is None)
+        if context is None:
+            return self.search_context(topic, search_depth="advanced", max_tokens=max_tokens)
+        return context
+
+    async def aadaptive_search_context(self, topic, max_tokens):
+        response = await self.key_pool.acall(
+            lambda client: client.search(topic, search_depth="basic", max_results=TAVILY_ADAPTIVE_MAX_RESULTS),
+            credits=SEARCH_DEPTH_CREDITS["basic"],
+        )
+        context = self.basic_context(response, max_tokens)
+        self.record_depth(escalated=context is None)
+        if context is None:
+            return await self.asearch_context(topic, search_depth="advanced", max_tokens=max_tokens)
+        return context
+
+    def request_search_context(self, topic, search_depth, max_tokens):
+        if search_depth == ADAPTIVE_DEPTH:
+            return self.adaptive_search_context(topic, max_tokens)
+        return self.key_pool.call(
+            lambda client: client.get_search_context(topic, search_depth=search_depth, max_tokens=max_tokens),
+            credits=SEARCH_DEPTH_CREDITS.get(search_depth, 1),
+        )
+
+    async def arequest_search_context(self, topic, search_depth, max_tokens):
+        if search_depth == ADAPTIVE_DEPTH:
+            return await self.aadaptive_search_context(topic, max_tokens)
+        return await self.key_pool.acall(
+            lambda client: client.get_search_context(topic, search_depth=search_depth, max_tokens=max_tokens),
+            credits=SEARCH_DEPTH_CREDITS.get(search_depth, 1),
+        )
+
+    def get_stats(self):
+        stats = self.cache.get_stats()
+        stats.update(self.flights.get_stats())
+        stats["key_pool"] = self.key_pool.get_stats()
+        with TAVILY_DEPTH_STATS_LOCK:
+            stats["depth"] = dict(TAVILY_DEPTH_STATS)
+        stats["depth"]["escalation_rate"] = stats["depth"]["escalated"] / stats["depth"]["adaptive"] if stats["depth"]["adaptive"] else 0.0
+        return stats
+
+TAVILY_CLIENT = TavilyProvider()
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from tavily import TavilyClient, AsyncTavilyClient
+from api.retry_policy import RATE_LIMIT, classify_error
+from api.background_loop import BackgroundLoop
+
+load_dotenv()
+
+# tavily-python raises UsageLimitExceededError for a plain 429, ForbiddenError for 403/432/433 plan and credit limits.
+RATE_LIMIT_ERROR_NAMES = ("UsageLimitExceeded",)
+QUOTA_ERROR_NAMES = ("Forbidden", "InvalidAPIKey", "MissingAPIKey")
+SEARCH_DEPTH_CREDITS = {"basic": 1, "advanced": 2}
+
+def configured_tavily_keys():
+    keys = []
+    index = 1
+    while os.getenv(f"TAVILY_API_KEY{index}"):
+        keys.append(os.getenv(f"TAVILY_API_KEY{index}"))
+        index += 1
+    if os.getenv("TAVILY_API_KEY") and os.getenv("TAVILY_API_KEY") not in keys:
+        keys.append(os.getenv("TAVILY_API_KEY"))
+    return keys
+
+class TavilyKey:
+    def __init__(self, label, api_key, quota=None, window=20, base_url=None):
+        client_options = {"api_base_url": base_url} if base_url else {}
+        self.label = label
+        self.client = TavilyClient(api_key=api_key, **client_options)
+        self.async_client = AsyncTavilyClient(api_key=api_key, **client_options)
+        self.quota = quota
+        self.used_credits = 0
+        self.in_flight = 0
+        self.outcomes = deque(maxlen=window)
+        self.ejected_until = 0.0
+        self.consecutive_ejections = 0
+        self.requests = 0
+
+    def remaining_fraction(self):
+        if not self.quota:
+            return 1.0
+        return max(0.0, self.quota - self.used_credits) / self.quota
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def score(self):
+        return self.remaining_fraction() * (1.0 - self.error_rate()) / (1 + self.in_flight)
+
+class TavilyKeyPool:
+    """Spreads Tavily requests over every configured API key, ejecting keys that hit rate or quota limits."""
+
+    def __init__(self, api_keys, quota=None, rate_limit_cooldown=30.0, quota_cooldown=3600.0, base_url=None):
+        self.keys = [TavilyKey(f"key{index + 1}", api_key, quota=quota, base_url=base_url) for index, api_key in enumerate(api_keys)]
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.quota_cooldown = quota_cooldown
+        self.lock = threading.Lock()
+        self.loop = BackgroundLoop(name="tavily")
+        self.stats = {"requests": 0, "failovers": 0, "ejections": 0}
+
+    def acquire(self, credits=1, exclude=()):
+        if not self.keys:
+            raise ValueError("No Tavily API keys are configured, set TAVILY_API_KEY1..N")
+        now = time.time()
+        with self.lock:
+            candidates = [key for key in self.keys if key not in exclude] or list(self.keys)
+            available = [key for key in candidates if key.ejected_until <= now and key.remaining_fraction() > 0]
+            if available:
+                key = max(available, key=lambda key: key.score())
+            else:
+                # Every key is cooling down, use the one that recovers first rather than failing outright.
+                key = min(candidates, key=lambda key: key.ejected_until)
+            key.in_flight += 1
+            key.requests += 1
+            key.used_credits += credits
+            self.stats["requests"] += 1
+        return key
+
+    def release(self, key, error=None):
+        with self.lock:
+            key.in_flight -= 1
+            key.outcomes.append(error is None)
+            if error is None:
+                key.consecutive_ejections = 0
+                return None
+            error_names = [cls.__name__ for cls in type(error).__mro__]
+            if any(marker in name for name in error_names for marker in QUOTA_ERROR_NAMES):
+                cooldown = self.quota_cooldown
+            elif any(marker in name for name in error_names for marker in RATE_LIMIT_ERROR_NAMES) or classify_error(error) == RATE_LIMIT:
+                cooldown = self.rate_limit_cooldown * (2 ** min(key.consecutive_ejections, 5))
+            else:
+                return classify_error(error)
+            key.consecutive_ejections += 1
+            key.ejected_until = time.time() + cooldown
+            self.stats["ejections"] += 1
+            print(f"Tavily {key.label} ejected for {cooldown:.0f} seconds: {error}")
+            return RATE_LIMIT
+
+    def call(self, func, credits=1):
+        tried = []
+        while True:
+            key = self.acquire(credits, exclude=tried)
+            try:
+                result = func(key.client)
+            except Exception as e:
+                category = self.release(key, e)
+                tried.append(key)
+                if category != RATE_LIMIT or len(tried) >= len(self.keys):
+                    raise
+                with self.lock:
+                    self.stats["failovers"] += 1
+                continue
+            self.release(key)
+            return result
+
+    async def acall(self, func, credits=1):
+        # Each AsyncTavilyClient keeps pooled connections bound to the loop that opened them, so all async calls share one loop.
+        return await self.loop.arun(self.acall_on_loop(func, credits))
+
+    async def acall_on_loop(self, func, credits):
+        tried = []
+        while True:
+            key = self.acquire(credits, exclude=tried)
+            try:
+                result = await func(key.async_client)
+            except Exception as e:
+                category = self.release(key, e)
+                tried.append(key)
+                if category != RATE_LIMIT or len(tried) >= len(self.keys):
+                    raise
+                with self.lock:
+                    self.stats["failovers"] += 1
+                continue
+            self.release(key)
+            return result
+
+    def get_stats(self):
+        now = time.time()
+        with self.lock:
+            stats = dict(self.stats)
+            stats["keys"] = [{
+                "label": key.label,
+                "requests": key.requests,
+                "used_credits": key.used_credits,
+                "remaining_fraction": key.remaining_fraction(),
+                "error_rate": key.error_rate(),
+                "in_flight": key.in_flight,
+                "ejected_for": max(0.0, key.ejected_until - now),
+            } for key in self.keys]
+        return stats
+
+TAVILY_KEY_POOL = TavilyKeyPool(
+    configured_tavily_keys(),
+    quota=int(os.getenv("TAVILY_KEY_QUOTA", 0)) or None,
+    rate_limit_cooldown=float(os.getenv("TAVILY_RATE_LIMIT_COOLDOWN", 30)),
+    quota_cooldown=float(os.getenv("TAVILY_QUOTA_COOLDOWN", 3600)),
+    base_url=os.getenv("TAVILY_BASE_URL"),
+)
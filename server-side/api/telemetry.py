@@ -0,0 +1,146 @@
+import time
+import bisect
+import threading
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 8)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            cumulative.append(("+Inf" if bound == float("inf") else bound, seen))
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": cumulative,
+        }
+
+class CallRecord:
+    def __init__(self, telemetry, caller, operation):
+        self.telemetry = telemetry
+        self.caller = caller
+        self.operation = operation
+        self.started_at = time.monotonic()
+        self.attempts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached = False
+        self.parse_outcome = "none"
+
+    def add_usage(self, completion):
+        usage = getattr(completion, "usage_metadata", None)
+        self.prompt_tokens += getattr(usage, "prompt_token_count", None) or 0
+        self.completion_tokens += getattr(usage, "candidates_token_count", None) or 0
+
+    def finish(self, error=None):
+        if error is not None:
+            outcome = getattr(error, "category", None) or "error"
+        else:
+            outcome = "cached" if self.cached else "ok"
+        self.telemetry.record(self, outcome, time.monotonic() - self.started_at)
+
+class LLMTelemetry:
+    """Aggregates per-call latency, token usage, retries and parse outcomes by caller."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.prompt_tokens = defaultdict(lambda: Histogram(TOKEN_BUCKETS))
+            self.completion_tokens = defaultdict(lambda: Histogram(TOKEN_BUCKETS))
+            self.attempts = defaultdict(lambda: Histogram(ATTEMPT_BUCKETS))
+
+    def start(self, caller, operation):
+        return CallRecord(self, caller, operation)
+
+    def record(self, call, outcome, latency):
+        series = (call.caller, call.operation)
+        with self.lock:
+            self.counters[("calls",) + series + (outcome,)] += 1
+            self.counters[("parse",) + series + (call.parse_outcome,)] += 1
+            self.counters[("prompt_tokens",) + series] += call.prompt_tokens
+            self.counters[("completion_tokens",) + series] += call.completion_tokens
+            self.counters[("retries",) + series] += max(0, call.attempts - 1)
+            self.latency[series].observe(latency)
+            self.attempts[series].observe(call.attempts)
+            if not call.cached:
+                self.prompt_tokens[series].observe(call.prompt_tokens)
+                self.completion_tokens[series].observe(call.completion_tokens)
+
+    def snapshot(self):
+        with self.lock:
+            callers = {}
+            for series in self.latency:
+                caller, operation = series
+                callers.setdefault(caller, {})[operation] = {
+                    "calls": {key[3]: value for key, value in self.counters.items() if key[0] == "calls" and key[1:3] == series},
+                    "parse": {key[3]: value for key, value in self.counters.items() if key[0] == "parse" and key[1:3] == series},
+                    "prompt_tokens_total": self.counters[("prompt_tokens",) + series],
+                    "completion_tokens_total": self.counters[("completion_tokens",) + series],
+                    "retries_total": self.counters[("retries",) + series],
+                    "latency_seconds": self.latency[series].snapshot(),
+                    "attempts": self.attempts[series].snapshot(),
+                    "prompt_tokens": self.prompt_tokens[series].snapshot(),
+                    "completion_tokens": self.completion_tokens[series].snapshot(),
+                }
+        return callers
+
+    def to_prometheus(self, prefix="llm"):
+        lines = []
+        with self.lock:
+            for name in ("calls", "parse"):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                for key, value in sorted(self.counters.items()):
+                    if key[0] == name:
+                        label = "outcome" if name == "calls" else "result"
+                        lines.append(f'{prefix}_{name}_total{{caller="{key[1]}",operation="{key[2]}",{label}="{key[3]}"}} {value}')
+            for name in ("prompt_tokens", "completion_tokens", "retries"):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                for key, value in sorted(self.counters.items()):
+                    if key[0] == name:
+                        lines.append(f'{prefix}_{name}_total{{caller="{key[1]}",operation="{key[2]}"}} {value}')
+            for name, histograms in (("latency_seconds", self.latency), ("attempts", self.attempts), ("prompt_tokens", self.prompt_tokens), ("completion_tokens", self.completion_tokens)):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for (caller, operation), histogram in sorted(histograms.items()):
+                    labels = f'caller="{caller}",operation="{operation}"'
+                    for bound, count in histogram.snapshot()["buckets"]:
+                        lines.append(f'{prefix}_{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{prefix}_{name}_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"{prefix}_{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+LLM_TELEMETRY = LLMTelemetry()
@@ -0,0 +1,41 @@
+import os
+import re
+import threading
+import tiktoken
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+# Used only when the encoding cannot be loaded, e.g. tiktoken has no cached copy and the host is offline.
+FALLBACK_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+class TokenCounter:
+    """Counts prompt tokens with a local tiktoken BPE encoding, shared by every token budget in the server."""
+
+    def __init__(self, encoding_name=TOKEN_ENCODING):
+        self.encoding_name = encoding_name
+        self.encoding = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if not self.loaded:
+                try:
+                    self.encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as e:
+                    print(f"Could not load the {self.encoding_name} token encoding, falling back to an estimate: {e}")
+                self.loaded = True
+            return self.encoding
+
+    def count(self, text):
+        if not text:
+            return 0
+        encoding = self.encoding if self.loaded else self.load()
+        if encoding is None:
+            return len(FALLBACK_TOKEN_PATTERN.findall(text))
+        # Gemini's own tokenizer is remote, a BPE count is close enough for budgets and stays off the network.
+        return len(encoding.encode(text, disallowed_special=()))
+
+TOKEN_COUNTER = TokenCounter()
+
+def count_tokens(text):
+    return TOKEN_COUNTER.count(text)
@@ -1,27 +1,64 @@
-import time
-
+import os
+import asyncio
 import PIL.Image
+from concurrent.futures import ThreadPoolExecutor
 from api.gemini_client import GeminiProvider
-from api.tavily_client import TavilyProvider
+from api.rate_limiter import estimate_tokens
+from api.tavily_client import TAVILY_CLIENT
+
+# gemini-1.5-flash caps a response at 8192 output tokens, batches are sized so their lessons fit under it.
+CONTENT_BATCH_OUTPUT_TOKENS = int(os.getenv("CONTENT_BATCH_OUTPUT_TOKENS", 8192))
+CONTENT_BATCH_OUTPUT_HEADROOM = float(os.getenv("CONTENT_BATCH_OUTPUT_HEADROOM", 0.8))
+CONTENT_SUBMODULE_OUTPUT_TOKENS = int(os.getenv("CONTENT_SUBMODULE_OUTPUT_TOKENS", 3000))
+CONTENT_BATCH_MIN_SUBSECTIONS = int(os.getenv("CONTENT_BATCH_MIN_SUBSECTIONS", 2))
+RESEARCH_CONCURRENCY = int(os.getenv("RESEARCH_CONCURRENCY", 6))
+
+SUBMODULE_CONTENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "subject_name": {"type": "STRING"},
+        "title_for_the_content": {"type": "STRING"},
+        "content": {"type": "STRING"},
+        "subsections": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "title": {"type": "STRING"},
+                    "content": {"type": "STRING"},
+                },
+                "required": ["title", "content"],
+            },
+        },
+        "urls": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["subject_name", "title_for_the_content", "content", "subsections"],
+}
+
+BATCH_CONTENT_SCHEMA = {"type": "ARRAY", "items": SUBMODULE_CONTENT_SCHEMA}
+
+LESSON_TYPE_GUIDANCE = {
+    "theoretical": "Cover essential aspects such as definitions, in-depth examples and any details crucial for understanding the topic. Include hypothetical scenario-based examples only where necessary, and real-world applications or use-cases that illustrate the relevance of the topic.",
+    "mathematical": "Cover definitions, theorems, proofs, derivations and practical problem-solving techniques. Break complex topics into simpler parts using appropriate notation and step-by-step calculations, include solved problems, and highlight common pitfalls and real-world applications.",
+    "technical": "Cover technical definitions, algorithms, formulas, methods and implementation details. Provide code samples or derivations where applicable, cover edge cases and pitfalls, and relate the sub-module to real-world system-level use cases.",
+}
 
 class ContentGenerator:
     def __init__(self):
-        self.gemini_client = GeminiProvider()
+        self.gemini_client = GeminiProvider(caller="ContentGenerator")
 
-    def generate_content(self, sub_modules : dict, module_name, course_name, api_key_to_use):
+    def generate_content(self, sub_modules : dict, module_name, course_name):
         prompt_content_gen = """I'm seeking your expertise on the sub-module : {sub_module_name} which comes under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, I trust in your ability to provide a comprehensive explanation of this sub-module. Think about the sub-module step by step and design the best way to explain the sub-module to a student. Your response should cover essential aspects such as definition, in-depth examples, and any details crucial for understanding the topic. Please generate quality content on the sub-module ensuring the response is sufficiently detailed covering all the relevant topics related to the sub-module. In your response, organize the information into subsections for clarity and elaborate on each subsection with suitable examples if and only if it is necessary. Include specific hypothetical scenario-based examples(only if it is necessary) or important sub-sections related to the subject to enhance practical understanding. If applicable, incorporate real-world examples, applications or use-cases to illustrate the relevance of the topic in various contexts. Additionally, incorporate anything that helps the student to better understand the topic. Ensure all the relevant aspects and topics related to the sub-module is covered in your response. Conclude your response by suggesting relevant URLs for further reading to empower users with additional resources on the subject. Please format your output as valid JSON, with the following keys: title_for_the_content (suitable title for the sub-module), content(an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list). Be a good educational assistant and craft the best way to explain the sub-module.Strictly, ensure that output shouldn't have any syntax errors and the given format is followed"""
         all_content = []
-        flag = 1 if api_key_to_use== 'first' else (2 if api_key_to_use=='second' else 3 )
-        print(f'THREAD {flag} RUNNING...')
         for key,val in sub_modules.items():
-            content_output = self.gemini_client.generate_json_response(prompt_content_gen.format(sub_module_name = val, module_name = module_name, course_name=course_name))
+            content_output = self.gemini_client.generate_json_response(prompt_content_gen.format(sub_module_name = val, module_name = module_name, course_name=course_name), validator=self.is_valid_content)
             print("Thread 1: Module Generated: ",key,"!")   
             content_output['subject_name'] = val
             print(content_output)
             all_content.append(content_output)
         return all_content
     
-    def generate_content_with_profile(self, sub_modules : dict, module_name, course_name, lesson_type, profile, api_key_to_use):
+    def generate_content_with_profile(self, sub_modules : dict, module_name, course_name, lesson_type, profile):
         theoretical_prompt = """I'm seeking your expertise on the sub-module : {sub_module_name} which comes under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, I trust in your ability to provide a comprehensive explanation of this sub-module. Think about the sub-module step by step and design the best way to explain the sub-module to a student.  You will also be provided with my course requirements and needs inside <INSTRUCTIONS>. Structure the course according to my needs.\n<INSTRUCTIONS>\nMY COURSE REQUIREMENTS : {profile}\n</INSTRUCTIONS>\n\nYour response should cover essential aspects such as definition, in-depth examples, and any details crucial for understanding the topic. Please generate quality content on the sub-module ensuring the response is sufficiently detailed covering all the relevant topics related to the sub-module. In your response, organize the information into subsections for clarity and elaborate on each subsection with suitable examples if and only if it is necessary. Include specific hypothetical scenario-based examples(only if it is necessary) or important sub-sections related to the subject to enhance practical understanding. If applicable, incorporate real-world examples, applications or use-cases to illustrate the relevance of the topic in various contexts. Additionally, incorporate anything that helps the student to better understand the topic. Ensure all the relevant aspects and topics related to the sub-module is covered in your response. Conclude your response by suggesting relevant URLs for further reading to empower users with additional resources on the subject. Please format your output as valid JSON, with the following keys: title_for_the_content (suitable title for the sub-module), content(an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list). Be a good educational assistant and craft the best way to explain the sub-module.Strictly, ensure that output shouldn't have any syntax errors and the given format is followed"""
 
         math_prompt = """I'm seeking your expertise on the mathematical sub-module: {sub_module_name} which comes under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable mathematical assistant, I trust in your ability to provide a clear, structured, and comprehensive explanation of this sub-module. Think about the mathematical concepts step by step and develop the best method to explain this sub-module to a student. You will also be provided with my course requirements and needs inside <INSTRUCTIONS>. Structure the course according to my needs.\n<INSTRUCTIONS>\nMY COURSE REQUIREMENTS : {profile}\n</INSTRUCTIONS>\n\nYour response should address key aspects such as definitions, theorems, proofs, and practical problem-solving techniques. Break down complex topics into simpler parts, using appropriate notations and step-by-step calculations. Structure the content into well-defined sections that focus on conceptual understanding, followed by real-world applications if applicable. Where necessary, provide equations or solved problems to teach me. Include hypothetical or practical examples, illustrating the application of mathematical principles through problem-solving exercises. Offer detailed explanations of the solutions, emphasizing core methodologies and any common pitfalls. Ensure the response is sufficiently detailed, covering all essential mathematical concepts and related sub-topics. Conclude by suggesting relevant URLs for further exploration, enabling users to expand their knowledge. Format the output as valid JSON, with the following keys: title_for_the_content (suitable title for the sub-module), content (an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list). Ensure that the output adheres strictly to the given format and does not contain any syntax errors."""
@@ -35,36 +72,20 @@ class ContentGenerator:
         else:
             prompt = theoretical_prompt    
         all_content = []
-        flag = 1 if api_key_to_use== 'first' else (2 if api_key_to_use=='second' else 3 )
-        print(f'THREAD {flag} RUNNING...')
         for key,val in sub_modules.items():
-            content_output = self.gemini_client.generate_json_response(prompt.format(sub_module_name = val, module_name = module_name, course_name=course_name, profile=profile))
+            content_output = self.gemini_client.generate_json_response(prompt.format(sub_module_name = val, module_name = module_name, course_name=course_name, profile=profile), validator=self.is_valid_content)
             print("Thread 1: Module Generated: ",key,"!")   
             content_output['subject_name'] = val
             print(content_output)
             all_content.append(content_output)
         return all_content
     
-    def generate_content_from_web(self, sub_modules: dict, module_name, course_name, api_key_to_use):
+    def generate_content_from_web(self, sub_modules: dict, module_name, course_name):
         content_generation_prompt = """I'm seeking your expertise on the subject of {sub_module_name}, which falls under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, you must provide a response in strictly formatted JSON.\n\nYour response should cover key aspects such as definitions, in-depth examples, and essential details to ensure a comprehensive understanding. This content must be structured specifically for educational purposes.\n\n**IMPORTANT**:\n1. Your response must **strictly adhere to JSON format** as shown below.\n2. Ensure that the output includes all required fields as JSON keys: `title_for_the_content`, `content`, `subsections`, and `urls`.\n3. Each `subsection` should be structured with `title` and `content` fields only.\n\nCONTENT GENERATION :\nUsing the subject information provided, generate detailed and informative content for the sub-module. Cover essential aspects such as definitions, real-world examples, and relevant applications. If helpful, use hypothetical scenarios to enhance practical understanding.\n\nSUBJECT INFORMATION:\n```{search_result}```\n--------------------------------\n<INSTRUCTIONS>\n- Organize the information into subsections for clarity and elaborate on each subsection with suitable examples if and only if it is necessary. \n- Include specific hypothetical scenario-based examples (only if it is necessary) or important sub-sections related to the subject to enhance practical understanding. \n- If applicable, incorporate real-world examples, applications or use-cases to illustrate the relevance of the topic in various contexts. Additionally, incorporate anything that helps the student to better understand the topic. \n- Ensure all the relevant aspects and topics related to the sub-module is covered in your response. \n- Conclude your response by suggesting relevant URLs for further reading to empower users with additional resources on the subject.\n- Format your output as valid JSON, with the following keys: title_for_the_content (suitable title for the sub-module), content(an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list). Follow the JSON format precisely, and ensure it is valid.\n</INSTRUCTIONS>\nYour JSON response should strictly follow the format given above. Failure to follow the exact JSON format will result in invalid output."""
-        flag = 1 if api_key_to_use== 'first' else (2 if api_key_to_use=='second' else 3 )
-        print(f'THREAD {flag} RUNNING...')
-        tavily_client = TavilyProvider(flag)        
-        all_content = []
-        for key, val in sub_modules.items():    
-            topic = course_name + "-" + module_name + " : " + val
-            print('Searching content for module:', topic)
-            search_result = tavily_client.search_context(topic)
-            output = self.gemini_client.generate_json_response(content_generation_prompt.format(sub_module_name = val, search_result = search_result, module_name=module_name, course_name=course_name))
-            print('Module Generated:', key, '!')
-            output['subject_name'] = val
-            print(output)
-            all_content.append(output)
-            time.sleep(3)
-
-        return all_content
+        build_prompt = lambda val, search_result: content_generation_prompt.format(sub_module_name = val, search_result = search_result, module_name=module_name, course_name=course_name)
+        return self.gemini_client.run(self.research_and_generate(TAVILY_CLIENT, sub_modules, module_name, course_name, build_prompt))
     
-    def generate_content_from_web_with_profile(self, sub_modules: dict, module_name, course_name, lesson_type, profile, api_key_to_use):
+    def generate_content_from_web_with_profile(self, sub_modules: dict, module_name, course_name, lesson_type, profile):
         theoretical_prompt = """I'm seeking your expertise on the subject of {sub_module_name}, which falls under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, you must provide a response in strictly formatted JSON.\n\nYour response should cover key aspects such as definitions, in-depth examples, and essential details to ensure a comprehensive understanding. This content must be structured specifically for educational purposes.\n\n**IMPORTANT**:\n1. Your response must **strictly adhere to JSON format** as shown below.\n2. Ensure that the output includes all required fields as JSON keys: `title_for_the_content`, `content`, `subsections`, and `urls`.\n3. Each `subsection` should be structured with `title` and `content` fields only.\n\nCONTENT GENERATION :\nUsing the subject information provided, generate detailed and informative content for the sub-module. Cover essential aspects such as definitions, real-world examples, and relevant applications. If helpful, use hypothetical scenarios to enhance practical understanding.\n\nSUBJECT INFORMATION:\n```{search_result}```\n--------------------------------\n<INSTRUCTIONS>\n- Organize the information into subsections for clarity and elaborate on each subsection with suitable examples if and only if it is necessary. \n- Include specific hypothetical scenario-based examples (only if it is necessary) or important sub-sections related to the subject to enhance practical understanding. \n- If applicable, incorporate real-world examples, applications or use-cases to illustrate the relevance of the topic in various contexts. Additionally, incorporate anything that helps the student to better understand the topic. \n- Ensure all the relevant aspects and topics related to the sub-module is covered in your response. \n- Conclude your response by suggesting relevant URLs for further reading to empower users with additional resources on the subject.\n- Format your output as valid JSON, with the following keys: title_for_the_content (suitable title for the sub-module), content(an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list). Follow the JSON format precisely, and ensure it is valid.\n- Follow the course requirements so I can better understand the topic.\n**Course Requirements**:{profile}\n</INSTRUCTIONS>\nYour JSON response should strictly follow the format given above. Failure to follow the exact JSON format will result in invalid output."""
 
         math_prompt = """I'm seeking your expertise on the mathematical sub-module: {sub_module_name}, which falls under the module: {module_name}. This module is part of the course: {course_name}. As a knowledgeable educational assistant, you must provide a response in strictly formatted JSON.  
@@ -141,24 +162,55 @@ Your JSON response must strictly adhere to the format and structure given above.
             prompt = technical_prompt
         else:
             prompt = theoretical_prompt 
-        flag = 1 if api_key_to_use== 'first' else (2 if api_key_to_use=='second' else 3 )
-        print(f'THREAD {flag} RUNNING...')
-        tavily_client = TavilyProvider(flag)        
-        all_content = []
-        for key, val in sub_modules.items():    
-            topic = course_name + "-" + module_name + " : " + val
-            print('Searching content for module:', topic)
-            search_result = tavily_client.search_context(topic)
-            output = self.gemini_client.generate_json_response(prompt.format(sub_module_name = val, search_result = search_result, module_name=module_name, course_name=course_name, profile=profile))
+        shared_instruction = prompt.format(sub_module_name = "the sub-module named in each request", search_result = "the SUBJECT INFORMATION provided with each request", module_name=module_name, course_name=course_name, profile=profile)
+        lesson_prefix = None
+        # The instructions are only moved into a cached prefix when they are large enough to be cached, inlining them gains nothing.
+        if self.gemini_client.can_cache_prefix(estimate_tokens(shared_instruction)):
+            lesson_prefix = self.gemini_client.register_prefix(shared_instruction)
+            if not lesson_prefix.is_cached():
+                lesson_prefix = None
+        if lesson_prefix is None:
+            build_prompt = lambda val, search_result: prompt.format(sub_module_name = val, search_result = search_result, module_name=module_name, course_name=course_name, profile=profile)
+        else:
+            build_prompt = lambda val, search_result: f"Sub-module: {val}\n\nSUBJECT INFORMATION:\n```{search_result}```"
+        try:
+            return self.gemini_client.run(self.research_and_generate(TAVILY_CLIENT, sub_modules, module_name, course_name, build_prompt, prefix=lesson_prefix))
+        finally:
+            self.gemini_client.release_prefix(lesson_prefix)
+
+    def research_topic(self, module_name, course_name, submodule_name):
+        return course_name + "-" + module_name + " : " + submodule_name
+
+    async def research_submodules(self, tavily_client, sub_modules : dict, module_name, course_name, concurrency=RESEARCH_CONCURRENCY):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def research(val):
+            topic = self.research_topic(module_name, course_name, val)
+            async with semaphore:
+                print('Searching content for module:', topic)
+                return await tavily_client.asearch_context(topic)
+
+        results = await asyncio.gather(*[research(val) for val in sub_modules.values()])
+        return dict(zip(sub_modules.keys(), results))
+
+    async def research_and_generate(self, tavily_client, sub_modules : dict, module_name, course_name, build_prompt, prefix=None, concurrency=RESEARCH_CONCURRENCY):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        # Each sub-module goes to the model as soon as its own search returns instead of waiting for the slowest one.
+        async def research_and_generate_one(key, val):
+            topic = self.research_topic(module_name, course_name, val)
+            async with semaphore:
+                print('Searching content for module:', topic)
+                search_result = await tavily_client.asearch_context(topic)
+            output = await self.gemini_client.agenerate_json_response(build_prompt(val, search_result), prefix=prefix, validator=self.is_valid_content)
             print('Module Generated:', key, '!')
             output['subject_name'] = val
             print(output)
-            all_content.append(output)
-            time.sleep(3)
+            return output
 
-        return all_content
+        return list(await asyncio.gather(*[research_and_generate_one(key, val) for key, val in sub_modules.items()]))
     
-    def generate_content_from_textbook(self, course_name, module_name, output:dict, profile, vectordb, api_key_to_use):
+    def generate_content_from_textbook(self, course_name, module_name, output:dict, profile, vectordb):
         prompt= """I'm seeking your expertise on the subject of {sub_module_name} which comes under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, I trust in your ability to provide a comprehensive explanation of this sub-module. Think about the sub-module step by step and design the best way to explain the sub-module to me. Your response should cover essential aspects such as definition, in-depth examples, and any details crucial for understanding the topic. You have access to the subject's information which you have to use while generating the educational content. Please generate quality content on the sub-module ensuring the response is sufficiently detailed covering all the relevant topics related to the sub-module. You will also be provided with my course requirements and needs inside <INSTRUCTIONS>. Structure the course according to my needs.
     
     SUBJECT INFORMATION : ```{context}```
@@ -172,13 +224,11 @@ Your JSON response must strictly adhere to the format and structure given above.
     """
 
         all_content = []
-        flag = 1 if api_key_to_use== 'first' else (2 if api_key_to_use=='second' else 3 )
-        print(f'THREAD {flag} RUNNING...')
         for key,val in output.items():
             relevant_docs = vectordb.similarity_search(val)
             rel_docs = [doc.page_content for doc in relevant_docs]
             context = '\n'.join(rel_docs)
-            content_output = self.gemini_client.generate_json_response(prompt.format(sub_module_name = val, module_name = module_name, profile= profile, context=context, course_name=course_name))
+            content_output = self.gemini_client.generate_json_response(prompt.format(sub_module_name = val, module_name = module_name, profile= profile, context=context, course_name=course_name), validator=self.is_valid_content)
             print("Thread 1: Module Generated: ",key,"!")   
             content_output['subject_name'] = val
             print(content_output)
@@ -199,8 +249,8 @@ Technical Breakdown: If the image involves technical or specialized content (e.g
 
 Logical Flow: Ensure your explanation is organized and flows logically to make it easier for another model to use this analysis to explain the broader topic effectively.
 
-Provide as much detail as possible and aim to enrich the understanding of the images in the context of the topic. Explain both the images separately. Here are the two images:"""
-        output = self.gemini_client.explain_two_image(prompt=prompt, image1_path=images[0], image2_path=images[1])
+Provide as much detail as possible and aim to enrich the understanding of the images in the context of the topic. Explain both the images separately. The two images follow this message."""
+        output = await self.gemini_client.aexplain_two_image(prompt=prompt, image1_path=images[0], image2_path=images[1], subject=sub_module_name)
         return output
     
     async def generate_content_from_textbook_and_images(self, course_name, module_name, lesson_type, submodule_name, profile, context, image_explanation):
@@ -281,7 +331,7 @@ Strictly follow the output format provided above. The response must be technical
         else:    
             prompt = theoretical_prompt
 
-        content_output = self.gemini_client.generate_json_response(prompt) 
+        content_output = await self.gemini_client.agenerate_json_response(prompt, validator=self.is_valid_content) 
         content_output['subject_name'] = submodule_name
         print(content_output)
 
@@ -351,13 +401,13 @@ Ensure your response is detailed, technically rigorous, and strictly follows the
             prompt = technical_prompt
         else:    
             prompt = theoretical_prompt
-        content_output = self.gemini_client.generate_json_response(prompt) 
+        content_output = await self.gemini_client.agenerate_json_response(prompt, validator=self.is_valid_content) 
         content_output['subject_name'] = submodule_name
         print(content_output)
 
         return content_output
     
-    async def generate_content_from_textbook_and_images_with_web(self, course_name, module_name, lesson_type, submodule_name, profile, context, image_explanation, web_context):
+    async def generate_content_from_textbook_and_images_with_web(self, course_name, module_name, lesson_type, submodule_name, profile, context, image_explanation, web_context, prefix=None):
         theoretical_prompt = f"""I'm seeking your expertise on the subject of {submodule_name} which comes under the module: {module_name}. This module is a part ofthe course: {course_name}. As a knowledgeable educational assistant, I trust in your ability to provide a comprehensive explanation of this sub-module. You will be given explanations for two images and some web context related to the topic, and you must use these effectively in your final response. The image explanations and web context are meant to enhance your content, providing additional visual and contextual understanding for the sub-module.
 
     Please think about the sub-module step by step and design the best way to explain it to me. Your response should cover essential aspects such as definitions, in-depth examples, and any details crucial for understanding the topic. You have access to the subject's information from the textbook, images, and web context, which you should use while generating the educational content. Ensure the response is sufficiently detailed, covering all relevant topics related to the sub-module. Structure the course according to my needs as provided.
@@ -451,13 +501,13 @@ Ensure your response is technically rigorous, and strictly follow the output for
             prompt = technical_prompt
         else:
             prompt = theoretical_prompt
-        content_output = self.gemini_client.generate_json_response(prompt) 
+        content_output = await self.gemini_client.agenerate_json_response(prompt, prefix=prefix, validator=self.is_valid_content) 
         content_output['subject_name'] = submodule_name
         print(content_output)
 
         return content_output
 
-    async def generate_single_content_from_textbook_with_web(self, course_name, module_name, lesson_type, submodule_name, profile, context, web_context):
+    async def generate_single_content_from_textbook_with_web(self, course_name, module_name, lesson_type, submodule_name, profile, context, web_context, prefix=None):
         theoretical_prompt = f"""I'm seeking your expertise on the subject of {submodule_name} which comes under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, I trust in your ability to provide a comprehensive explanation of this sub-module. You will have access to subject information from the textbook and relevant web-based context to create a well-rounded educational response. Think about the sub-module step by step and design the best way to explain it to me.
 
     Your response should cover essential aspects such as definition, in-depth examples, and any details crucial for understanding the topic. Use both the textbook information and web context effectively while generating the educational content. Please ensure that your response is sufficiently detailed, covering all relevant topics. Structure the course content according to my specific needs provided in <INSTRUCTIONS>.
@@ -542,8 +592,101 @@ Ensure your response is detailed, technically accurate, and adheres strictly to
         else:
             prompt = theoretical_prompt
 
-        content_output = self.gemini_client.generate_json_response(prompt)
+        content_output = await self.gemini_client.agenerate_json_response(prompt, prefix=prefix, validator=self.is_valid_content)
         content_output['subject_name'] = submodule_name
         print(content_output)
 
         return content_output
+
+    def lesson_system_instruction(self, course_name, module_name, lesson_type, profile):
+        guidance = LESSON_TYPE_GUIDANCE.get(lesson_type, LESSON_TYPE_GUIDANCE["theoretical"])
+        return f"""You are a knowledgeable educational assistant writing content for the sub-modules of the module: {module_name}, which is a part of the course: {course_name}. {guidance}
+When a LESSON TEXTBOOK CONTEXT is provided, treat it as additional SUBJECT INFORMATION for every sub-module of this lesson.
+MY COURSE REQUIREMENTS : {profile}"""
+
+    def build_batch_prompt(self, batch : list, module_name, course_name, lesson_type, profile, search_results=None):
+        guidance = LESSON_TYPE_GUIDANCE.get(lesson_type, LESSON_TYPE_GUIDANCE["theoretical"])
+        prompt = f"""I'm seeking your expertise on several sub-modules which come under the module: {module_name}. This module is a part of the course: {course_name}. As a knowledgeable educational assistant, think about each sub-module step by step and design the best way to explain it to a student. You will also be provided with my course requirements and needs inside <INSTRUCTIONS>. Structure the content according to my needs.
+<INSTRUCTIONS>
+MY COURSE REQUIREMENTS : {profile}
+</INSTRUCTIONS>
+
+For every sub-module: {guidance} Ensure the response is sufficiently detailed and covers all the relevant topics related to the sub-module. Organize the information into subsections for clarity and elaborate on each subsection. Conclude by suggesting relevant URLs for further reading.
+
+Return a JSON array with exactly one object per sub-module, in the same order as the sub-modules are listed below. Each object must have the keys: subject_name (the sub-module name exactly as given), title_for_the_content (suitable title for the sub-module), content (an introduction of the sub-module), subsections (a list of dictionaries with keys - title and content), and urls (a list).
+
+SUB-MODULES:
+"""
+        for index, (key, val) in enumerate(batch):
+            prompt += f"{index + 1}. {val}\n"
+            if search_results is not None:
+                prompt += f"SUBJECT INFORMATION for {val}: ```{search_results[key]}```\n"
+        return prompt
+
+    def is_valid_content(self, item):
+        if not isinstance(item, dict):
+            return False
+        if not isinstance(item.get("title_for_the_content"), str) or not isinstance(item.get("content"), str):
+            return False
+        if not item["title_for_the_content"].strip() or not item["content"].strip():
+            return False
+        subsections = item.get("subsections")
+        if not isinstance(subsections, list) or len(subsections) < CONTENT_BATCH_MIN_SUBSECTIONS:
+            return False
+        return all(isinstance(subsection, dict) and isinstance(subsection.get("title"), str) and isinstance(subsection.get("content"), str) and subsection["content"].strip() for subsection in subsections)
+
+    def match_batch_outputs(self, batch : list, outputs):
+        if not isinstance(outputs, list):
+            outputs = []
+        by_name = {item.get("subject_name", "").strip().lower(): item for item in outputs if isinstance(item, dict) and isinstance(item.get("subject_name"), str)}
+        matched = []
+        for index, (key, val) in enumerate(batch):
+            item = by_name.get(val.strip().lower())
+            if item is None and len(outputs) == len(batch):
+                item = outputs[index]
+            matched.append(item if self.is_valid_content(item) else None)
+        return matched
+
+    def generate_content_batch(self, batch : list, module_name, course_name, lesson_type, profile, search_web, search_results=None):
+        if search_web and search_results is None:
+            search_results = asyncio.run(self.research_submodules(TAVILY_CLIENT, dict(batch), module_name, course_name))
+        prompt = self.build_batch_prompt(batch, module_name, course_name, lesson_type, profile, search_results)
+        try:
+            outputs = self.gemini_client.generate_json_response(prompt, response_schema=BATCH_CONTENT_SCHEMA, allow_truncated=False)
+        except Exception as e:
+            print(f"Batched generation failed ({e}), generating its {len(batch)} sub-modules individually...")
+            outputs = None
+        all_content = []
+        for (key, val), output in zip(batch, self.match_batch_outputs(batch, outputs)):
+            if output is None:
+                print(f"Batched output for {val} failed validation, generating it individually...")
+                if search_web:
+                    output = self.generate_content_from_web_with_profile({key: val}, module_name, course_name, lesson_type, profile)[0]
+                else:
+                    output = self.generate_content_with_profile({key: val}, module_name, course_name, lesson_type, profile)[0]
+            output['subject_name'] = val
+            all_content.append(output)
+        return all_content
+
+    def output_batch_size(self):
+        return max(1, int(CONTENT_BATCH_OUTPUT_TOKENS * CONTENT_BATCH_OUTPUT_HEADROOM) // CONTENT_SUBMODULE_OUTPUT_TOKENS)
+
+    def generate_content_batch_with_profile(self, sub_modules : dict, module_name, course_name, lesson_type, profile, batch_size=None, search_web=False):
+        items = list(sub_modules.items())
+        batch_size = max(1, batch_size or self.output_batch_size())
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        search_results = None
+        if search_web:
+            # Research every sub-module up front so no batch waits on searches issued one after another.
+            search_results = asyncio.run(self.research_submodules(TAVILY_CLIENT, sub_modules, module_name, course_name))
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(self.generate_content_batch, batch, module_name, course_name, lesson_type, profile, search_web, search_results)
+                for batch in batches
+            ]
+            results = [future.result() for future in futures]
+        all_content = []
+        for batch_content in results:
+            all_content.extend(batch_content)
+        print(f"Generated {len(all_content)} sub-modules in {len(batches)} batched requests")
+        return all_content
@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import threading
+from api.token_counter import count_tokens
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def split_web_context(web_context):
+    if not web_context:
+        return []
+    try:
+        items = json.loads(web_context)
+    except (TypeError, ValueError):
+        return [web_context]
+    if not isinstance(items, list):
+        return [web_context]
+    chunks = []
+    for item in items:
+        if isinstance(item, str):
+            try:
+                item = json.loads(item)
+            except ValueError:
+                chunks.append(item)
+                continue
+        if isinstance(item, dict):
+            content = item.get("content", "")
+            chunks.append(f"Source: {item['url']}\n{content}" if item.get("url") else content)
+        else:
+            chunks.append(str(item))
+    return [chunk for chunk in chunks if chunk]
+
+class ContextSource:
+    def __init__(self, name, chunks, priority=0, share=1.0):
+        self.name = name
+        self.chunks = [chunks] if isinstance(chunks, str) else [chunk for chunk in (chunks or []) if chunk]
+        self.priority = priority
+        self.share = share
+        self.tokens = [count_tokens(chunk) for chunk in self.chunks]
+
+    def demand(self, separator_tokens):
+        return sum(self.tokens) + separator_tokens * max(0, len(self.chunks) - 1)
+
+class ContextAssembler:
+    """Fits textbook, web and image-explanation context into a per-prompt token budget."""
+
+    def __init__(self, budget_tokens=6000, separator="\n"):
+        self.budget_tokens = budget_tokens
+        self.separator = separator
+        self.separator_tokens = count_tokens(separator)
+        self.lock = threading.Lock()
+        self.stats = {"assembled": 0, "truncated": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def allocate(self, sources, budget):
+        allocation = {}
+        remaining = budget
+        pending = sorted(sources, key=lambda source: source.priority)
+        # Water-fill: sources that need less than their share release the rest to the others.
+        while pending:
+            total_share = sum(source.share for source in pending) or 1.0
+            satisfied = [source for source in pending if source.demand(self.separator_tokens) <= remaining * source.share / total_share]
+            if not satisfied:
+                break
+            for source in satisfied:
+                allocation[source.name] = source.demand(self.separator_tokens)
+                remaining -= allocation[source.name]
+            pending = [source for source in pending if source.name not in allocation]
+        if pending:
+            total_share = sum(source.share for source in pending) or 1.0
+            for source in pending:
+                allocation[source.name] = int(remaining * source.share / total_share)
+            leftover = remaining - sum(allocation[source.name] for source in pending)
+            # Rounding leftovers go to the highest-priority source that can still use them.
+            for source in pending:
+                extra = min(leftover, source.demand(self.separator_tokens) - allocation[source.name])
+                allocation[source.name] += extra
+                leftover -= extra
+        return allocation
+
+    def truncate(self, source, budget):
+        selected = []
+        used = 0
+        for chunk, tokens in zip(source.chunks, source.tokens):
+            cost = tokens + (self.separator_tokens if selected else 0)
+            if used + cost <= budget:
+                selected.append(chunk)
+                used += cost
+                continue
+            partial = self.truncate_text(chunk, budget - used - (self.separator_tokens if selected else 0))
+            if partial:
+                selected.append(partial)
+            break
+        return self.separator.join(selected)
+
+    def truncate_text(self, text, budget):
+        if budget <= 0:
+            return ""
+        kept = []
+        used = 0
+        for sentence in SENTENCE_BOUNDARY.split(text):
+            tokens = count_tokens(sentence)
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            used += tokens
+        if kept:
+            return " ".join(kept)
+        # Not even the first sentence fits, cut it at a word boundary instead of dropping the chunk.
+        for word in text.split():
+            tokens = count_tokens(word)
+            if used + tokens > budget:
+                break
+            kept.append(word)
+            used += tokens
+        return " ".join(kept)
+
+    def assemble(self, sources, budget_tokens=None):
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        allocation = self.allocate(sources, budget)
+        assembled = {}
+        truncated = False
+        input_tokens = 0
+        output_tokens = 0
+        for source in sources:
+            demand = source.demand(self.separator_tokens)
+            input_tokens += demand
+            if demand <= allocation[source.name]:
+                assembled[source.name] = self.separator.join(source.chunks)
+                output_tokens += demand
+            else:
+                assembled[source.name] = self.truncate(source, allocation[source.name])
+                output_tokens += count_tokens(assembled[source.name])
+                truncated = True
+        with self.lock:
+            self.stats["assembled"] += 1
+            self.stats["truncated"] += int(truncated)
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+        return assembled
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+CONTEXT_TEXTBOOK_SHARE = float(os.getenv("CONTEXT_TEXTBOOK_SHARE", 0.5))
+CONTEXT_WEB_SHARE = float(os.getenv("CONTEXT_WEB_SHARE", 0.35))
+CONTEXT_IMAGE_SHARE = float(os.getenv("CONTEXT_IMAGE_SHARE", 0.15))
+CONTEXT_ASSEMBLER = ContextAssembler(budget_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000)))
+
+def build_prompt_context(textbook_chunks=None, web_context=None, image_explanation=None, budget_tokens=None):
+    sources = [ContextSource("textbook", textbook_chunks, priority=0, share=CONTEXT_TEXTBOOK_SHARE)]
+    if web_context is not None:
+        sources.append(ContextSource("web", split_web_context(web_context), priority=1, share=CONTEXT_WEB_SHARE))
+    if image_explanation is not None:
+        sources.append(ContextSource("images", image_explanation, priority=2, share=CONTEXT_IMAGE_SHARE))
+    return CONTEXT_ASSEMBLER.assemble(sources, budget_tokens)
@@ -3,7 +3,7 @@ import time
 
 class Evaluator:
     def __init__(self):
-        self.gemini_client = GeminiProvider()
+        self.gemini_client = GeminiProvider(caller="Evaluator")
     
     def evaluate_video_for_soft_skills(self, video_path : str, scenario : str):
         prompt = f"""Analyze the input video of the user engaging in a conversation in the following scenario: {scenario}.\nFocus on the user's tone of voice, facial expressions, and emotional cues. Assess the following soft skills based on observable behaviors: confidence, body language, communication, articulation, presentation, vocabulary, problem-solving, adaptability, stress management, emotional intelligence, active listening, and leadership. For each soft skill, provide a brief analysis highlighting strengths and areas for improvement. Assign a score from 1 to 10 for each skill, with 10 indicating exceptional proficiency and 1 representing minimal proficiency. If a skill cannot be reasonably evaluated from the video, return 'None' for that skill.\n**INSTRUCTIONS:**  \n- The output should strictly follow the format of a list of JSON objects.  \n- Each JSON object must contain:  \n* **Key 1:** *"Name of the soft skill"* with a brief analysis as the value.  \n* **Key 2:** *"score"* with a value between 1 and 10.  \n- If a skill cannot be evaluated, the analysis should return *"None"*.  \n- The format and structure of the output must exactly match the provided example."""
@@ -11,7 +11,6 @@ class Evaluator:
 
         video_file = self.gemini_client.upload_file(video_path, mime_type="video/webm")
         response = self.gemini_client.generate_json_response(prompt, file=video_file)
-        self.gemini_client.delete_file(video_file)
         return response
     
     def evaluate_quiz_for_soft_skills(self, quiz_responses : list[dict]):
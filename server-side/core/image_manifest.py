@@ -0,0 +1,53 @@
+import os
+import re
+import json
+import hashlib
+
+IMAGE_MANIFEST_FILENAME = "image-manifest.json"
+PDF_IMAGE_NAME = re.compile(r"^image_(\d+)_\d+$")
+
+class ImageManifest:
+    """Maps CLIP index row ids to extracted image files, stored relative to the lesson's index directory."""
+
+    def __init__(self, index_directory, entries):
+        self.index_directory = index_directory
+        self.entries = entries
+        self.paths = [os.path.join(index_directory, entry["path"]) for entry in entries]
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def build(index_directory, image_directory_path, image_paths):
+        entries = []
+        for image_id, image_path in enumerate(image_paths):
+            relative_to_images = os.path.relpath(image_path, image_directory_path)
+            # PDF images are extracted to <pdf name>/image_<page>_<index>.<ext>, web images sit in their own folder.
+            parts = relative_to_images.split(os.sep)
+            page = PDF_IMAGE_NAME.match(os.path.splitext(parts[-1])[0])
+            entries.append({
+                "id": image_id,
+                "path": os.path.relpath(image_path, index_directory),
+                "source": parts[0] if len(parts) > 1 else None,
+                "page": int(page.group(1)) if page else None,
+                "sha256": ImageManifest.file_hash(image_path),
+            })
+        return ImageManifest(index_directory, entries)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"images": self.entries}, f)
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            entries = json.load(f)["images"]
+        return ImageManifest(os.path.dirname(path), entries)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,141 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import threading
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_FILENAME = "docstore.db"
+
+def is_mapped_store(directory):
+    return os.path.exists(os.path.join(directory, DOCSTORE_FILENAME))
+
+def write_mapped_store(vectorstore, directory):
+    faiss.write_index(vectorstore.index, os.path.join(directory, INDEX_FILENAME))
+    connection = sqlite3.connect(os.path.join(directory, DOCSTORE_FILENAME))
+    try:
+        connection.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+        rows = []
+        for row, doc_id in vectorstore.index_to_docstore_id.items():
+            document = vectorstore.docstore.search(doc_id)
+            rows.append((int(row), doc_id, document.page_content, json.dumps(document.metadata, default=str)))
+        connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        connection.commit()
+    finally:
+        connection.close()
+
+def save_mapped_store(vectorstore, directory):
+    """Writes a LangChain FAISS store as a raw FAISS index plus a sqlite sidecar of chunk texts, without pickling."""
+    directory = os.path.abspath(directory)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    # Every save goes to a fresh versioned directory, and the store path is a symlink to the current version.
+    version_directory = f"{directory}.v-{uuid.uuid4().hex}"
+    os.makedirs(version_directory)
+    try:
+        write_mapped_store(vectorstore, version_directory)
+    except BaseException:
+        shutil.rmtree(version_directory, ignore_errors=True)
+        raise
+    previous_directory = os.path.realpath(directory) if os.path.islink(directory) else None
+    if previous_directory is None and os.path.isdir(directory):
+        # A store saved before versioning is a real directory, a link can only take its place once it is moved aside.
+        previous_directory = f"{directory}.v-{uuid.uuid4().hex}"
+        os.replace(directory, previous_directory)
+    link_path = f"{directory}.link-{uuid.uuid4().hex}"
+    # Relative, so the link still resolves after a staging directory holding it is renamed into place.
+    os.symlink(os.path.basename(version_directory), link_path)
+    # Swapping the link is a single rename, readers see the old version or the new one and the path never disappears.
+    os.replace(link_path, directory)
+    if previous_directory is not None:
+        # Stores already open keep their handles on the old files, stores that reconnect see the swap and refuse.
+        shutil.rmtree(previous_directory, ignore_errors=True)
+
+def read_mapped_index(path):
+    # Flat indexes can only be memory-mapped by newer faiss builds, older ones fall back to a regular read.
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError:
+        return faiss.read_index(path, faiss.IO_FLAG_READ_ONLY)
+
+class MappedTextStore:
+    """Read-only text store over a memory-mapped FAISS index whose chunks are fetched lazily from sqlite by row id."""
+
+    def __init__(self, directory, embeddings):
+        # Resolved once so the index and the sidecar always come from the same saved version.
+        directory = os.path.realpath(directory)
+        self.directory = directory
+        self.embeddings = embeddings
+        self.index = read_mapped_index(os.path.join(directory, INDEX_FILENAME))
+        self.docstore_path = os.path.join(directory, DOCSTORE_FILENAME)
+        self.docstore_signature = self.sidecar_signature()
+        self.lock = threading.Lock()
+        self.connection = self.connect()
+
+    def sidecar_signature(self):
+        try:
+            stat = os.stat(self.docstore_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def connect(self):
+        # Reconnecting after close() must not pair this index with a sidecar from a later save, or one already removed.
+        if self.docstore_signature is None or self.sidecar_signature() != self.docstore_signature:
+            raise RuntimeError(f"Vector store at {self.directory} was replaced, reload it")
+        return sqlite3.connect(f"file:{self.docstore_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def fetch_documents(self, rows):
+        rows = sorted({int(row) for row in rows if row >= 0})
+        if not rows:
+            return {}
+        placeholders = ",".join("?" for _ in rows)
+        with self.lock:
+            # Reopened after close(), so a store evicted from the cache still serves requests already holding it.
+            if self.connection is None:
+                self.connection = self.connect()
+            records = self.connection.execute(f"SELECT row, page_content, metadata FROM chunks WHERE row IN ({placeholders})", rows).fetchall()
+        return {row: Document(page_content=page_content, metadata=json.loads(metadata)) for row, page_content, metadata in records}
+
+    def search_vectors(self, vectors, k):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        return self.index.search(vectors, min(k, self.index.ntotal))
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        distances, rows = self.search_vectors(embedding, k)
+        documents = self.fetch_documents(rows[0])
+        return [(documents[int(row)], float(distance)) for row, distance in zip(rows[0], distances[0]) if int(row) in documents]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_by_vectors(self, embeddings, k=4):
+        # One index scan and one sidecar read for a whole batch of queries.
+        _, rows = self.search_vectors(embeddings, k)
+        documents = self.fetch_documents(rows.ravel())
+        return [[documents[int(row)] for row in query_rows if int(row) in documents] for query_rows in rows]
+
+    def similarity_search_with_score(self, query, k=4):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    async def asimilarity_search(self, query, k=4):
+        return await asyncio.to_thread(self.similarity_search, query, k)
+
+    async def asimilarity_search_with_score(self, query, k=4):
+        return await asyncio.to_thread(self.similarity_search_with_score, query, k)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
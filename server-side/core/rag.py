@@ -3,13 +3,24 @@ from models.data_utils import DocumentUtils
 from api.serper_client import SerperProvider
 from api.tavily_client import TavilyProvider
 from core.content_generator import ContentGenerator
-from langchain_community.vectorstores.faiss import FAISS
+from core.context_assembler import build_prompt_context
+from api.rate_limiter import estimate_tokens
+from core.vectorstore_registry import VECTORSTORE_REGISTRY, IMAGE_INDEX
+from core.mmap_vectorstore import MappedTextStore, save_mapped_store
+from core.image_manifest import ImageManifest, IMAGE_MANIFEST_FILENAME
 import faiss
 import os
+import numpy as np
+import re
+import uuid
+import shutil
+import hashlib
 import asyncio
 from pykka import ThreadingActor
 from concurrent.futures import ThreadPoolExecutor
 
+IMAGE_SEARCH_TOP_K = int(os.getenv("IMAGE_SEARCH_TOP_K", 5))
+
 class ResultHandler(ThreadingActor):
     async def receive(self, message):
         if isinstance(message, str):
@@ -38,13 +49,15 @@ class SimpleRAG:
         os.makedirs(self.faiss_vectorstore_directory, exist_ok=True)
         self.text_vectorstore_path = os.path.join(self.faiss_vectorstore_directory, course_name)
         if text_vectorstore_path is not None:
-            self.text_vectorstore = FAISS.load_local(text_vectorstore_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+            self.text_vectorstore = VECTORSTORE_REGISTRY.load_text_store(text_vectorstore_path, embeddings)
         else:
             self.text_vectorstore = None
         
     async def create_text_vectorstore(self):
         self.text_vectorstore = await DocumentLoader.create_faiss_vectorstore_for_text(documents_directory=self.syllabus_directory_path, embeddings=self.embeddings, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap, input_type='pdf', links=[])
-        self.text_vectorstore.save_local(self.text_vectorstore_path)
+        save_mapped_store(self.text_vectorstore, self.text_vectorstore_path)
+        # Reopen the saved copy so the in-memory index built above can be released.
+        self.text_vectorstore = VECTORSTORE_REGISTRY.load_text_store(self.text_vectorstore_path, self.embeddings)
         return self.text_vectorstore_path
     
     async def search_similar_text(self, query, k=5):
@@ -67,11 +80,14 @@ class MultiModalRAG:
             chunk_size=1000,
             chunk_overlap=200,
             image_similarity_threshold=0.22,
+            image_top_k=IMAGE_SEARCH_TOP_K,
             text_vectorstore_path=None,
             image_vectorstore_path=None,
             input_type=None,
             links=None,
             include_images=None,
+            company_id=None,
+            namespace=None,
     ):
         self.course_name = course_name
         self.lesson_name = lesson_name
@@ -86,30 +102,108 @@ class MultiModalRAG:
         self.clip_processor = clip_processor
         self.clip_tokenizer = clip_tokenizer
         self.image_similarity_threshold = image_similarity_threshold
+        self.image_top_k = image_top_k
         if input_type not in ["pdf", "link", "pdf_and_link", "pdf_and_web"]:
             raise Exception("input_type should be pdf, link, pdf_and_link or pdf_and_web")
         self.input_type = input_type
         self.links = links
+        self.include_images = include_images
+        self.company_id = company_id
 
         self.current_dir = os.path.dirname(__file__)
         self.faiss_vectorstore_directory = os.path.join(self.current_dir, 'faiss-vectorstore')
         os.makedirs(self.faiss_vectorstore_directory, exist_ok=True)
-        self.image_directory_path = os.path.join(self.current_dir, 'extracted-images', lesson_name)
-        self.text_vectorstore_path = os.path.join(self.faiss_vectorstore_directory, 'text-faiss-index')
-        self.image_vectorstore_path = os.path.join(self.faiss_vectorstore_directory, 'image-faiss-index')
+        if namespace is None and text_vectorstore_path is not None:
+            namespace = os.path.relpath(os.path.dirname(text_vectorstore_path), self.faiss_vectorstore_directory)
+        self.namespace = namespace if namespace is not None else self.build_namespace()
+        self.set_index_directory(os.path.join(self.faiss_vectorstore_directory, self.namespace))
         if text_vectorstore_path is not None:
-            self.text_vectorstore = FAISS.load_local(text_vectorstore_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+            self.text_vectorstore = VECTORSTORE_REGISTRY.load_text_store(text_vectorstore_path, embeddings)
         else:
             self.text_vectorstore = None
         
-        if image_vectorstore_path is not None:
-            self.image_vectorstore = faiss.read_index(image_vectorstore_path)
+        if image_vectorstore_path is not None and os.path.exists(image_vectorstore_path):
+            self.image_vectorstore = VECTORSTORE_REGISTRY.load_image_index(image_vectorstore_path)
+            self.image_manifest = self.load_image_manifest(os.path.join(os.path.dirname(image_vectorstore_path), IMAGE_MANIFEST_FILENAME))
         else:
             self.image_vectorstore = None
-        
-        self.include_images = include_images
+            self.image_manifest = None
+
+    def set_index_directory(self, index_directory):
+        self.index_directory = index_directory
+        self.image_directory_path = os.path.join(index_directory, 'extracted-images')
+        if os.path.abspath(index_directory) == os.path.abspath(self.faiss_vectorstore_directory):
+            # Indexes saved before namespacing sit directly in faiss-vectorstore, with their images under extracted-images/<lesson>.
+            self.image_directory_path = os.path.join(self.current_dir, 'extracted-images', self.lesson_name or "")
+        self.text_vectorstore_path = os.path.join(index_directory, 'text-faiss-index')
+        self.image_vectorstore_path = os.path.join(index_directory, 'image-faiss-index')
+        self.image_manifest_path = os.path.join(index_directory, IMAGE_MANIFEST_FILENAME)
+
+    @staticmethod
+    def load_image_manifest(manifest_path):
+        # Indexes built before the manifest existed fall back to walking the image directory.
+        if not os.path.exists(manifest_path):
+            return None
+        return VECTORSTORE_REGISTRY.load_image_manifest(manifest_path)
+
+    def content_hash(self):
+        digest = hashlib.sha256()
+        for part in (self.input_type, bool(self.include_images), self.chunk_size, self.chunk_overlap, sorted(self.links or [])):
+            digest.update(repr(part).encode("utf-8"))
+        if os.path.isdir(self.documents_directory_path):
+            for filename in sorted(os.listdir(self.documents_directory_path)):
+                file_path = os.path.join(self.documents_directory_path, filename)
+                if not os.path.isfile(file_path):
+                    continue
+                digest.update(filename.encode("utf-8"))
+                with open(file_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()[:16]
+
+    def build_namespace(self):
+        parts = [self.company_id or "shared", self.course_name or "course", self.lesson_name or "lesson"]
+        safe_parts = [re.sub(r'[^A-Za-z0-9_.-]+', '_', str(part)).strip('._') or "_" for part in parts]
+        return os.path.join(*safe_parts, self.content_hash())
+
+    def load_published_vectorstores(self):
+        self.text_vectorstore = VECTORSTORE_REGISTRY.load_text_store(self.text_vectorstore_path, self.embeddings)
+        if os.path.exists(self.image_vectorstore_path):
+            self.image_vectorstore = VECTORSTORE_REGISTRY.load_image_index(self.image_vectorstore_path)
+            self.image_manifest = self.load_image_manifest(self.image_manifest_path)
+        return self.text_vectorstore_path, self.image_vectorstore_path
 
     async def create_text_and_image_vectorstores(self):
+        final_directory = self.index_directory
+        build_lock = VECTORSTORE_REGISTRY.build_lock(self.namespace)
+        await asyncio.to_thread(build_lock.acquire)
+        try:
+            # A concurrent or earlier build of the same lesson content already published this namespace.
+            if os.path.isdir(final_directory):
+                print(f"\nReusing vector stores for {self.namespace}\n")
+                return self.load_published_vectorstores()
+            staging_directory = f"{final_directory}.staging-{uuid.uuid4().hex}"
+            os.makedirs(staging_directory)
+            self.set_index_directory(staging_directory)
+            try:
+                await self.build_vectorstores()
+            except BaseException:
+                shutil.rmtree(staging_directory, ignore_errors=True)
+                raise
+            finally:
+                self.set_index_directory(final_directory)
+            if not VECTORSTORE_REGISTRY.publish(staging_directory, final_directory):
+                return self.load_published_vectorstores()
+        finally:
+            build_lock.release()
+        self.text_vectorstore = VECTORSTORE_REGISTRY.load_text_store(self.text_vectorstore_path, self.embeddings)
+        if self.image_vectorstore is not None and os.path.exists(self.image_vectorstore_path):
+            VECTORSTORE_REGISTRY.register(IMAGE_INDEX, self.image_vectorstore_path, self.image_vectorstore)
+            # The manifest built in staging resolves paths there, reload it from the published directory.
+            self.image_manifest = self.load_image_manifest(self.image_manifest_path)
+        return self.text_vectorstore_path, self.image_vectorstore_path
+
+    async def build_vectorstores(self):
         result_handler = ResultHandler.start()
         try:
             if self.include_images:
@@ -119,181 +213,179 @@ class MultiModalRAG:
                         executor.submit(asyncio.run, DocumentLoader.create_faiss_vectorstore_for_image(self.documents_directory_path, self.image_directory_path, self.clip_model, self.clip_processor, self.input_type, self.links)),
                     ]
                 self.text_vectorstore = tasks[0].result()
-                self.image_vectorstore = tasks[1].result()
+                self.image_vectorstore, image_paths = tasks[1].result()
                 result_handler.tell((self.text_vectorstore, self.image_vectorstore))
                 faiss.write_index(self.image_vectorstore, self.image_vectorstore_path)
+                self.image_manifest = ImageManifest.build(self.index_directory, self.image_directory_path, image_paths)
+                self.image_manifest.save(self.image_manifest_path)
             else:
                 self.text_vectorstore = await DocumentLoader.create_faiss_vectorstore_for_text(self.documents_directory_path, self.embeddings, self.chunk_size, self.chunk_overlap, self.input_type, self.links)
                 result_handler.tell("Text Vector store created")
         finally:
             result_handler.stop()
             
-        self.text_vectorstore.save_local(self.text_vectorstore_path)
-        return self.text_vectorstore_path, self.image_vectorstore_path
+        save_mapped_store(self.text_vectorstore, self.text_vectorstore_path)
 
     def search_image(self, query_text, image_paths):
-        query_image_embeddings = DocumentUtils.embed_text_with_clip(text=query_text, clip_model=self.clip_model, clip_tokenizer=self.clip_tokenizer)
-        dist, indx = self.image_vectorstore.search(query_image_embeddings, k=len(image_paths))
-        distances = dist[0]
-        indexes = indx[0]
-        sorted_images = [image_paths[idx] for idx in indexes]
-        top_k_images = [sorted_images[i] for i in range(len(indexes)) if distances[i]>= self.image_similarity_threshold]
+        return self.search_images([query_text], image_paths)[0]
+
+    def search_images(self, query_texts, image_paths):
+        query_image_embeddings = DocumentUtils.embed_texts_with_clip(texts=query_texts, clip_model=self.clip_model, clip_tokenizer=self.clip_tokenizer)
+        # Only images above the threshold come back, so the cost does not grow with every extracted figure.
+        lims, distances, indexes = self.image_vectorstore.range_search(query_image_embeddings, self.image_similarity_threshold)
+        top_k_images = []
+        for i in range(len(query_texts)):
+            matches = sorted(zip(distances[lims[i]:lims[i + 1]], indexes[lims[i]:lims[i + 1]]), reverse=True)[:self.image_top_k]
+            top_k_images.append([image_paths[idx] for _, idx in matches])
         return top_k_images
 
     def search_text(self, query_text, k):
         top_k_docs = self.text_vectorstore.similarity_search(query_text, k=k)
         return top_k_docs
+
+    def search_texts(self, query_texts, k):
+        if not query_texts:
+            return []
+        # embed_query uses the retrieval_query task type, keep it so batched vectors match single-query ones.
+        query_embeddings = np.asarray(self.embeddings.embed_documents(query_texts, task_type="retrieval_query"), dtype=np.float32)
+        if isinstance(self.text_vectorstore, MappedTextStore):
+            return self.text_vectorstore.similarity_search_by_vectors(query_embeddings, k=k)
+        # Stores saved before the mapped format are LangChain FAISS objects, search their index directly.
+        _, rows = self.text_vectorstore.index.search(query_embeddings, min(k, self.text_vectorstore.index.ntotal))
+        docstore, ids = self.text_vectorstore.docstore, self.text_vectorstore.index_to_docstore_id
+        return [[docstore.search(ids[int(row)]) for row in query_rows if row >= 0] for query_rows in rows]
+
+    async def retrieve(self, submodule_names, top_k_docs, images_in_directory):
+        if len(images_in_directory) >= 5:
+            relevant_docs, top_images = await asyncio.gather(
+                asyncio.to_thread(self.search_texts, submodule_names, top_k_docs),
+                asyncio.to_thread(self.search_images, submodule_names, images_in_directory),
+            )
+        else:
+            relevant_docs = await asyncio.to_thread(self.search_texts, submodule_names, top_k_docs)
+            top_images = [[] for _ in submodule_names]
+        return relevant_docs, top_images
     
     async def asearch_text(self, query_text, k):
         top_k_docs = self.text_vectorstore.asimilarity_search(query_text, k=k)
         return top_k_docs
     
-    async def run(self, content_generator : ContentGenerator, module_name : str, submodule_split : dict, profile : str, top_k_docs : int):
+    def list_extracted_images(self):
         images_in_directory = []
         if self.include_images:
             for root, dirs, files in os.walk(self.image_directory_path):
                 for file in files:
                     if file.endswith(('png', 'jpg', 'jpeg')):
                         images_in_directory.append(os.path.join(root, file))
-        submodule_content = []
-        submodule_images=[]
-        for key, val in submodule_split.items():
-            if len(images_in_directory) >= 5:
-                with ThreadPoolExecutor() as executor:
-                    future_docs = executor.submit(self.search_text, val, top_k_docs)
-                    future_images = executor.submit(self.search_image, val, images_in_directory)
-                relevant_docs = future_docs.result()
-                top_images = future_images.result()
+        return images_in_directory
+
+    def indexed_images(self):
+        if self.image_manifest is not None:
+            return self.image_manifest.paths
+        return self.list_extracted_images()
+
+    async def generate_submodule(self, content_generator : ContentGenerator, module_name : str, submodule_name : str, profile : str, relevant_docs : list, top_images : list, seen_images=None):
+        rel_docs = [doc.page_content for doc in relevant_docs]
+        result_handler = ResultHandler.start()
+        try:
+            if len(top_images) >= 2:
                 relevant_images = [DocumentUtils.image_to_base64(image_path) for image_path in top_images]
-                if len(top_images) >= 2:
-                    rel_docs = [doc.page_content for doc in relevant_docs]
-                    context = '\n'.join(rel_docs)
-                    image_explanation = await content_generator.generate_explanation_from_images(top_images[:2], val)
-                    output = await content_generator.generate_content_from_textbook_and_images(self.course_name, module_name, self.lesson_type, val, profile, context, image_explanation)
-                else:
-                    rel_docs = [doc.page_content for doc in relevant_docs]
-                    context = '\n'.join(rel_docs)
-                    result_handler = ResultHandler.start()
-                    try:
-                        relevant_images, output = await asyncio.gather(
-                            SerperProvider.submodule_image_from_web(val),
-                            content_generator.generate_single_content_from_textbook(self.course_name, module_name, self.lesson_type, val, profile, context)
-                        )
-                        result_handler.tell(relevant_images)
-                        result_handler.tell(output)
-                    finally:
-                        result_handler.stop()
+                image_explanation = await content_generator.generate_explanation_from_images(top_images[:2], submodule_name)
+                prompt_context = build_prompt_context(rel_docs, image_explanation=image_explanation)
+                output = await content_generator.generate_content_from_textbook_and_images(self.course_name, module_name, self.lesson_type, submodule_name, profile, prompt_context["textbook"], prompt_context["images"])
             else:
-                relevant_docs = self.search_text(val, top_k_docs)
-                rel_docs = [doc.page_content for doc in relevant_docs]
-                context = '\n'.join(rel_docs)
-                result_handler = ResultHandler.start()
-                try:
-                    relevant_images, output = await asyncio.gather(
-                        SerperProvider.submodule_image_from_web(val),
-                        content_generator.generate_single_content_from_textbook(self.course_name, module_name, self.lesson_type, val, profile, context)
-                    )
-                    result_handler.tell(relevant_images)
-                    result_handler.tell(output)
-                finally:
-                    result_handler.stop()
-            submodule_content.append(output)
-            submodule_images.append(relevant_images)
-        return submodule_content, submodule_images
-    
-    async def run_with_web(self, content_generator : ContentGenerator, tavily_client: TavilyProvider, module_name : str, submodule_split : dict, profile : str, top_k_docs : int):
-        images_in_directory = []
-        if self.include_images:
-            for root, dirs, files in os.walk(self.image_directory_path):
-                for file in files:
-                    if file.endswith(('png', 'jpg', 'jpeg')):
-                        images_in_directory.append(os.path.join(root, file))
-        submodule_content = []
-        submodule_images=[]
-        for key, val in submodule_split.items():
-            tavily_query = self.course_name + " : " + val
-            if len(images_in_directory) >= 5:
-                with ThreadPoolExecutor() as executor:
-                    future_docs = executor.submit(self.search_text, val, top_k_docs)
-                    future_images = executor.submit(self.search_image, val, images_in_directory)
-                    future_web_context = executor.submit(tavily_client.search_context, tavily_query)
-                relevant_docs = future_docs.result()
-                top_images = future_images.result()
-                web_context = future_web_context.result()
+                prompt_context = build_prompt_context(rel_docs)
+                relevant_images, output = await asyncio.gather(
+                    SerperProvider.submodule_image_from_web(submodule_name, seen_images),
+                    content_generator.generate_single_content_from_textbook(self.course_name, module_name, self.lesson_type, submodule_name, profile, prompt_context["textbook"])
+                )
+            result_handler.tell(relevant_images)
+            result_handler.tell(output)
+        finally:
+            result_handler.stop()
+        return output, relevant_images
+
+    async def generate_submodule_with_web(self, content_generator : ContentGenerator, tavily_client : TavilyProvider, module_name : str, submodule_name : str, profile : str, relevant_docs : list, top_images : list, lesson_prefix=None, shared_chunks=frozenset(), seen_images=None):
+        tavily_query = self.course_name + " : " + submodule_name
+        web_context = await tavily_client.asearch_context(tavily_query)
+        rel_docs = [doc.page_content for doc in relevant_docs if doc.page_content not in shared_chunks]
+        result_handler = ResultHandler.start()
+        try:
+            if len(top_images) >= 2:
                 relevant_images = [DocumentUtils.image_to_base64(image_path) for image_path in top_images]
-                if len(top_images) >= 2:
-                    rel_docs = [doc.page_content for doc in relevant_docs]
-                    context = '\n'.join(rel_docs)
-                    image_explanation = await content_generator.generate_explanation_from_images(top_images[:2], val)
-                    output = await content_generator.generate_content_from_textbook_and_images_with_web(self.course_name, module_name, self.lesson_type, val, profile, context, image_explanation, web_context)
-                else:
-                    rel_docs = [doc.page_content for doc in relevant_docs]
-                    context = '\n'.join(rel_docs)
-                    result_handler = ResultHandler.start()
-                    try:
-                        relevant_images, output = await asyncio.gather(
-                            SerperProvider.submodule_image_from_web(val),
-                            content_generator.generate_single_content_from_textbook_with_web(self.course_name, module_name, self.lesson_type, val, profile, context, web_context)
-                        )
-                        result_handler.tell(relevant_images)
-                        result_handler.tell(output)
-                    finally:
-                        result_handler.stop()
+                image_explanation = await content_generator.generate_explanation_from_images(top_images[:2], submodule_name)
+                prompt_context = build_prompt_context(rel_docs, web_context=web_context, image_explanation=image_explanation)
+                output = await content_generator.generate_content_from_textbook_and_images_with_web(self.course_name, module_name, self.lesson_type, submodule_name, profile, prompt_context["textbook"], prompt_context["images"], prompt_context["web"], prefix=lesson_prefix)
             else:
-                with ThreadPoolExecutor() as executor:
-                    future_docs = executor.submit(self.search_text, val, top_k_docs)
-                    future_web_context = executor.submit(tavily_client.search_context, tavily_query)
-                relevant_docs = future_docs.result()
-                web_context = future_web_context.result()
-                rel_docs = [doc.page_content for doc in relevant_docs]
-                context = '\n'.join(rel_docs)
-                result_handler = ResultHandler.start()
-                try:
-                    relevant_images, output = await asyncio.gather(
-                        SerperProvider.submodule_image_from_web(val),
-                        content_generator.generate_single_content_from_textbook_with_web(self.course_name, module_name, self.lesson_type, val, profile, context, web_context)
-                    )
-                    result_handler.tell(relevant_images)
-                    result_handler.tell(output)
-                finally:
-                    result_handler.stop()
-            submodule_content.append(output)
-            submodule_images.append(relevant_images)
+                prompt_context = build_prompt_context(rel_docs, web_context=web_context)
+                relevant_images, output = await asyncio.gather(
+                    SerperProvider.submodule_image_from_web(submodule_name, seen_images),
+                    content_generator.generate_single_content_from_textbook_with_web(self.course_name, module_name, self.lesson_type, submodule_name, profile, prompt_context["textbook"], prompt_context["web"], prefix=lesson_prefix)
+                )
+            result_handler.tell(relevant_images)
+            result_handler.tell(output)
+        finally:
+            result_handler.stop()
+        return output, relevant_images
+
+    async def notify_result(self, index, submodule_task, on_result):
+        output, relevant_images = await submodule_task
+        if on_result is not None:
+            on_result(index, output, relevant_images)
+        return output, relevant_images
+
+    async def run(self, content_generator : ContentGenerator, module_name : str, submodule_split : dict, profile : str, top_k_docs : int, on_result=None):
+        submodule_names = list(submodule_split.values())
+        relevant_docs, top_images = await self.retrieve(submodule_names, top_k_docs, self.indexed_images())
+        seen_images = set()
+        results = await asyncio.gather(*[
+            self.notify_result(index, self.generate_submodule(content_generator, module_name, val, profile, relevant_docs[index], top_images[index], seen_images), on_result)
+            for index, val in enumerate(submodule_names)
+        ])
+        submodule_content = [output for output, _ in results]
+        submodule_images = [relevant_images for _, relevant_images in results]
         return submodule_content, submodule_images
     
-    async def execute(self, content_generator, tavily_client, module_name, submodules: dict, profile, top_k_docs=5, search_web=False):
-        keys_list = list(submodules.keys())
-        submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
-        submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
-        submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
-        result_handler = ResultHandler.start()
+    async def register_lesson_prefix(self, content_generator : ContentGenerator, module_name : str, profile : str, lesson_context_k : int):
+        gemini_client = content_generator.gemini_client
+        system_instruction = content_generator.lesson_system_instruction(self.course_name, module_name, self.lesson_type, profile)
+        lesson_docs = await asyncio.to_thread(self.search_text, module_name, lesson_context_k)
+        lesson_context = "LESSON TEXTBOOK CONTEXT:\n" + '\n'.join(doc.page_content for doc in lesson_docs)
+        # Below the model's minimum cacheable size the prefix could only be inlined, repeating what every sub-module prompt already says.
+        if not gemini_client.can_cache_prefix(estimate_tokens([system_instruction, lesson_context])):
+            return None, frozenset()
+        lesson_prefix = await gemini_client.aregister_prefix(system_instruction, lesson_context)
+        if lesson_prefix.is_cached():
+            return lesson_prefix, frozenset(doc.page_content for doc in lesson_docs)
+        return None, frozenset()
 
+    async def run_with_web(self, content_generator : ContentGenerator, tavily_client: TavilyProvider, module_name : str, submodule_split : dict, profile : str, top_k_docs : int, on_result=None):
+        submodule_names = list(submodule_split.values())
+        seen_images = set()
+        (lesson_prefix, shared_chunks), (relevant_docs, top_images) = await asyncio.gather(
+            self.register_lesson_prefix(content_generator, module_name, profile, lesson_context_k=3 * top_k_docs),
+            self.retrieve(submodule_names, top_k_docs, self.indexed_images()),
+        )
+        try:
+            results = await asyncio.gather(*[
+                self.notify_result(index, self.generate_submodule_with_web(content_generator, tavily_client, module_name, val, profile, relevant_docs[index], top_images[index], lesson_prefix, shared_chunks, seen_images), on_result)
+                for index, val in enumerate(submodule_names)
+            ])
+        finally:
+            await content_generator.gemini_client.arelease_prefix(lesson_prefix)
+        submodule_content = [output for output, _ in results]
+        submodule_images = [relevant_images for _, relevant_images in results]
+        return submodule_content, submodule_images
+    
+    async def execute(self, content_generator, tavily_client, module_name, submodules: dict, profile, top_k_docs=5, search_web=False, on_result=None):
+        result_handler = ResultHandler.start()
         try:
             if search_web:
-                with ThreadPoolExecutor() as executor:
-                    tasks = [
-                        executor.submit(asyncio.run, self.run_with_web(content_generator=content_generator, tavily_client=tavily_client, module_name=module_name, submodule_split=submodules_split_one, profile=profile, top_k_docs=top_k_docs)),
-                        executor.submit(asyncio.run, self.run_with_web(content_generator=content_generator, tavily_client=tavily_client, module_name=module_name, submodule_split=submodules_split_two, profile=profile, top_k_docs=top_k_docs)),
-                        executor.submit(asyncio.run, self.run_with_web(content_generator=content_generator, tavily_client=tavily_client, module_name=module_name, submodule_split=submodules_split_three, profile=profile, top_k_docs=top_k_docs)),
-                    ]
-                    results = [task.result() for task in tasks]
+                content, images = await self.run_with_web(content_generator=content_generator, tavily_client=tavily_client, module_name=module_name, submodule_split=submodules, profile=profile, top_k_docs=top_k_docs, on_result=on_result)
             else:
-                with ThreadPoolExecutor() as executor:
-                    tasks = [
-                        executor.submit(asyncio.run, self.run(content_generator, module_name, submodules_split_one, profile, top_k_docs)),
-                        executor.submit(asyncio.run, self.run(content_generator, module_name, submodules_split_two, profile, top_k_docs)),
-                        executor.submit(asyncio.run, self.run(content_generator, module_name, submodules_split_three, profile, top_k_docs)),
-                    ]
-                    results = [task.result() for task in tasks]
-
-            content = []
-            images = []
-            for content_part, images_part in results:
-                content.extend(content_part)
-                images.extend(images_part)
-                result_handler.tell((content_part, images_part))
-
+                content, images = await self.run(content_generator, module_name, submodules, profile, top_k_docs, on_result=on_result)
+            result_handler.tell((content, images))
         finally:
             result_handler.stop()
 
-        return content, images
\ No newline at end of file
+        return content, images
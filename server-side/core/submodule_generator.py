@@ -2,10 +2,11 @@ from api.gemini_client import GeminiProvider
 from api.tavily_client import TavilyProvider
 import asyncio
 from langchain_community.vectorstores import FAISS
+from core.context_assembler import build_prompt_context
 
 class SubModuleGenerator:
     def __init__(self):
-        self.gemini_client = GeminiProvider()
+        self.gemini_client = GeminiProvider(caller="SubModuleGenerator")
         self.tavily_client = TavilyProvider()
 
     def generate_submodules(self, module_name):
@@ -40,9 +41,11 @@ class SubModuleGenerator:
             vectordb.asimilarity_search('Important topics on '+ module_name)
         )
         rel_docs = [doc.page_content for doc in relevant_docs]
-        texbook_context = '\n'.join(rel_docs)
+        prompt_context = build_prompt_context(rel_docs, web_context=web_context)
+        texbook_context = prompt_context["textbook"]
+        web_context = prompt_context["web"]
 
         module_generation_prompt = f"""You are an educational assistant with knowledge in various domains. A student is seeking your expertise to learn a given topic. You will be provided with context from their textbook as well the latest context from the internet. Your task is to design course modules to complete all the major concepts about the topic in the textbook. Craft six module names for the student to learn the topic they wish. Ensure the module names are relevant to the topic using both: the textbook context as well as the web context provided to you. The context might contain information that is irrelevant to the topic. You MUST only use the relevant knowledge from both the context and ignore the part which is irrelevant to the topic. \nn**Topic**: ```{topic}```\n\n**Textbook Context**: ```{texbook_context}```\n\n**Web Context**: ```{web_context}```\nThe output should be in json format where each key corresponds to the sub-module number and the values are the sub-module names. Do not consider summary or any irrelevant topics as module names.\n"""
         module_generation_prompt += """# EXAMPLE OUTPUT FORMAT:\n{ {"1": "Data Retrieval Methods"}, {"2": "Knowledge Base Construction"} }\nFollow the provided JSON format diligently."""
-        output = self.gemini_client.generate_json_response(module_generation_prompt)
+        output = await self.gemini_client.agenerate_json_response(module_generation_prompt)
         return output
\ No newline at end of file
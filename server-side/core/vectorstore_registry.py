@@ -0,0 +1,140 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+import faiss
+from langchain_community.vectorstores.faiss import FAISS
+from core.mmap_vectorstore import MappedTextStore, is_mapped_store
+from core.image_manifest import ImageManifest
+
+TEXT_STORE = "text"
+IMAGE_INDEX = "image"
+IMAGE_MANIFEST = "image_manifest"
+
+class VectorStoreRegistry:
+    """Keeps recently used FAISS text stores and image indexes in memory, keyed by path and modification time."""
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        self.build_locks = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "registered": 0}
+
+    @staticmethod
+    def signature(path):
+        # Text stores are directories (index.faiss + docstore.db, or index.pkl for older ones), image indexes a single file.
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in os.listdir(path)]
+            stats = [os.stat(file) for file in files if os.path.isfile(file)]
+            return max((stat.st_mtime_ns for stat in stats), default=0), sum(stat.st_size for stat in stats)
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def lookup(self, key, mtime):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] != mtime:
+                self.stats["stale"] += 1
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+            # Mapped stores hold an open sqlite handle, release it instead of waiting for garbage collection.
+            close = getattr(entry[1], "close", None)
+            if callable(close):
+                close()
+
+    def store(self, key, mtime, value, size):
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (mtime, value, size)
+            self.total_bytes += size
+            # Always keep the newest entry, even if it alone exceeds the budget.
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                evicted_key = next(iter(self.entries))
+                self.remove(evicted_key)
+                self.stats["evictions"] += 1
+
+    def load(self, kind, path, loader):
+        key = (kind, os.path.abspath(path))
+        mtime, size = self.signature(path)
+        value = self.lookup(key, mtime)
+        if value is not None:
+            return value
+        with self.lock:
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # Another thread may have finished loading the same index while this one waited.
+            value = self.lookup(key, mtime)
+            if value is not None:
+                return value
+            try:
+                value = loader(path)
+                self.store(key, mtime, value, size)
+                return value
+            finally:
+                # Later loads find the cached value, so the lock is only needed while this one is in flight.
+                with self.lock:
+                    if self.load_locks.get(key) is load_lock:
+                        del self.load_locks[key]
+
+    def register(self, kind, path, value):
+        mtime, size = self.signature(path)
+        self.store((kind, os.path.abspath(path)), mtime, value, size)
+        with self.lock:
+            self.stats["registered"] += 1
+
+    @staticmethod
+    def read_text_store(path, embeddings):
+        if is_mapped_store(path):
+            return MappedTextStore(path, embeddings)
+        # Indexes saved before the mapped format still go through the pickled docstore.
+        return FAISS.load_local(path, embeddings=embeddings, allow_dangerous_deserialization=True)
+
+    def load_text_store(self, path, embeddings):
+        return self.load(TEXT_STORE, path, lambda path: self.read_text_store(path, embeddings))
+
+    def load_image_index(self, path):
+        return self.load(IMAGE_INDEX, path, faiss.read_index)
+
+    def load_image_manifest(self, path):
+        return self.load(IMAGE_MANIFEST, path, ImageManifest.load)
+
+    def build_lock(self, namespace):
+        with self.lock:
+            return self.build_locks.setdefault(namespace, threading.Lock())
+
+    @staticmethod
+    def publish(staging_directory, final_directory):
+        # A rename is atomic, so readers see either no index or a complete one, never a half-written file.
+        os.makedirs(os.path.dirname(final_directory), exist_ok=True)
+        try:
+            os.rename(staging_directory, final_directory)
+        except OSError:
+            if not os.path.isdir(final_directory):
+                raise
+            # Another process published the same content first, keep its copy.
+            shutil.rmtree(staging_directory, ignore_errors=True)
+            return False
+        return True
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["total_bytes"] = self.total_bytes
+        return stats
+
+VECTORSTORE_REGISTRY = VectorStoreRegistry(max_bytes=int(os.getenv("VECTORSTORE_CACHE_MAX_MB", 1024)) * 1024 * 1024)
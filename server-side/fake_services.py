@@ -0,0 +1,406 @@
+import os
+import re
+import ast
+import json
+import time
+import math
+import random
+import hashlib
+import argparse
+import threading
+from flask import Flask, Response, jsonify, request
+
+# Point the clients at this server with:
+#   GEMINI_BASE_URL=http://localhost:8765/gemini/
+#   TAVILY_BASE_URL=http://localhost:8765/tavily
+#   SERPER_BASE_URL=http://localhost:8765/serper
+#   SERPAPI_BASE_URL=http://localhost:8765/serpapi
+DEFAULT_SERVICE_CONFIG = {
+    "latency_ms": 400,
+    "latency_sigma": 0.5,
+    "error_rate": 0.0,
+    "rate_limit_every": 0,
+    "rate_limit_duration": 0,
+}
+DEFAULT_CONFIG = {
+    "seed": None,
+    "embedding_dimensions": 768,
+    "templates": [],
+    "services": {
+        "gemini": dict(DEFAULT_SERVICE_CONFIG, latency_ms=1500),
+        "embeddings": dict(DEFAULT_SERVICE_CONFIG, latency_ms=150),
+        "tavily": dict(DEFAULT_SERVICE_CONFIG, latency_ms=800),
+        "serper": dict(DEFAULT_SERVICE_CONFIG, latency_ms=300),
+        "serpapi": dict(DEFAULT_SERVICE_CONFIG, latency_ms=900),
+    },
+}
+
+class FaultInjector:
+    """Samples lognormal latencies, random 5xx errors and periodic 429 bursts per service."""
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.random = random.Random(config.get("seed"))
+        self.stats = {}
+        self.configure(config)
+
+    def configure(self, config):
+        with self.lock:
+            self.config = config
+
+    def service_config(self, service):
+        return dict(DEFAULT_SERVICE_CONFIG, **self.config["services"].get(service, {}))
+
+    def in_rate_limit_burst(self, settings):
+        if not settings["rate_limit_every"] or not settings["rate_limit_duration"]:
+            return False
+        elapsed = time.monotonic() - self.started_at
+        return elapsed % settings["rate_limit_every"] < settings["rate_limit_duration"]
+
+    def sample(self, service):
+        settings = self.service_config(service)
+        with self.lock:
+            stats = self.stats.setdefault(service, {"requests": 0, "errors": 0, "rate_limited": 0, "total_latency": 0.0})
+            stats["requests"] += 1
+            latency = 0.0
+            if settings["latency_ms"] > 0:
+                sigma = settings["latency_sigma"]
+                # Lognormal with the configured mean, so the long tail looks like a real API.
+                latency = self.random.lognormvariate(math.log(settings["latency_ms"] / 1000) - sigma * sigma / 2, sigma)
+            stats["total_latency"] += latency
+            if self.in_rate_limit_burst(settings):
+                stats["rate_limited"] += 1
+                return latency, 429
+            if self.random.random() < settings["error_rate"]:
+                stats["errors"] += 1
+                return latency, 503
+        return latency, None
+
+    def get_stats(self):
+        with self.lock:
+            return {service: dict(stats) for service, stats in self.stats.items()}
+
+def load_config(path=None):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    path = path or os.getenv("FAKE_SERVICES_CONFIG")
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        services = overrides.pop("services", {})
+        config.update(overrides)
+        for service, settings in services.items():
+            config["services"].setdefault(service, dict(DEFAULT_SERVICE_CONFIG)).update(settings)
+    return config
+
+def stable_int(*parts):
+    return int(hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:12], 16)
+
+def prompt_topic(prompt):
+    for pattern in (r"Sub-module:\s*([^\n]+)", r"sub-module:?\s*([^\n.]+)", r"subject of ([^\n.]+)", r"related to ([^\n.]+)"):
+        match = re.search(pattern, prompt, re.IGNORECASE)
+        if match:
+            return match.group(1).strip()[:80]
+    return "the topic"
+
+def fake_paragraph(topic, seed):
+    sentences = [
+        f"{topic} builds on a small set of core ideas that are easiest to learn through worked examples.",
+        f"A practical way to approach {topic} is to start from a concrete scenario and generalise from it.",
+        f"Common mistakes with {topic} usually come from skipping the definitions and jumping to the tools.",
+        f"In day-to-day work, {topic} shows up whenever a team has to trade accuracy against speed.",
+        f"Reviewing {topic} with a checklist makes it easier to spot gaps before they become problems.",
+    ]
+    rng = random.Random(seed)
+    return " ".join(rng.sample(sentences, 3))
+
+def prompt_list_items(prompt):
+    # Batched prompts number their sub-modules under a SUB-MODULES: heading, one per line.
+    heading = re.search(r"SUB-MODULES:\s*\n", prompt)
+    if not heading:
+        return []
+    items = []
+    for match in re.finditer(r"^(\d+)\.\s*(.+)$", prompt[heading.end():], re.MULTILINE):
+        # Numbered lines inside the search results are skipped by requiring the next number in sequence.
+        if int(match.group(1)) == len(items) + 1:
+            items.append(match.group(2).strip())
+    return items
+
+def value_for_schema(schema, name, topic, seed, topics=None):
+    schema_type = str(schema.get("type", "STRING")).upper()
+    if schema.get("enum"):
+        return schema["enum"][seed % len(schema["enum"])]
+    if schema_type == "OBJECT":
+        properties = schema.get("properties", {})
+        return {key: value_for_schema(child, key, topic, stable_int(seed, key)) for key, child in properties.items()}
+    if schema_type == "ARRAY":
+        if topics:
+            return [value_for_schema(schema.get("items", {}), name, item_topic, stable_int(seed, index)) for index, item_topic in enumerate(topics)]
+        count = max(int(schema.get("minItems", 1) or 1), 3)
+        return [value_for_schema(schema.get("items", {}), name, topic, stable_int(seed, index)) for index in range(count)]
+    if schema_type == "INTEGER":
+        return seed % 10
+    if schema_type == "NUMBER":
+        return round((seed % 1000) / 100, 2)
+    if schema_type == "BOOLEAN":
+        return seed % 2 == 0
+    if name in ("subject_name", "skill_area"):
+        return topic
+    if name and (name.lower() in ("title", "name", "subject", "submodule") or name.lower().startswith("title")):
+        return f"{topic.title()} {seed % 100}"
+    if name == "urls":
+        return f"https://example.com/{seed}"
+    return f"## {topic.title()}\n\n{fake_paragraph(topic, seed)}"
+
+def content_json(topic, seed):
+    return {
+        "title_for_the_content": topic.title(),
+        "content": fake_paragraph(topic, seed),
+        "subsections": [{"title": f"{topic.title()} part {index + 1}", "content": fake_paragraph(topic, stable_int(seed, index))} for index in range(3)],
+        "urls": [f"https://example.com/{stable_int(topic, index)}" for index in range(2)],
+    }
+
+def quiz_json(prompt, seed):
+    skills = ["the topic"]
+    match = re.search(r"\*\*Skill Input\*\*:\s*(\[.*?\])", prompt, re.DOTALL)
+    if match:
+        try:
+            skills = [str(skill) for skill in ast.literal_eval(match.group(1))] or skills
+        except (ValueError, SyntaxError):
+            pass
+    questions = []
+    for skill in skills:
+        for index in range(3):
+            options = [f"{skill} option {letter}" for letter in "ABCD"]
+            questions.append({
+                "skill_area": skill,
+                "question": f"Which approach to {skill} fits scenario {index + 1} best?",
+                "options": options,
+                "answer": options[stable_int(seed, skill, index) % 4],
+            })
+    return questions
+
+def soft_skill_report_json(prompt, seed):
+    skills = list(dict.fromkeys(re.findall(r"\*\*Skill Area:\*\*\s*([^\n]+)", prompt))) or ["Communication"]
+    return {
+        "summary": fake_paragraph("these soft skills", seed),
+        "observations": {skill: fake_paragraph(skill, stable_int(seed, skill)) for skill in skills},
+        "recommendations": {skill: fake_paragraph(skill, stable_int(seed, skill, "advice")) for skill in skills},
+    }
+
+def submodule_names_json(topic, seed):
+    return {str(index + 1): f"{topic.title()} {name}" for index, name in enumerate(("Foundations", "Core Concepts", "Methods", "Tools", "Applications", "Case Studies"))}
+
+def default_json(topic, seed):
+    return {
+        "title": topic.title(),
+        "content": f"## {topic.title()}\n\n{fake_paragraph(topic, seed)}",
+        "key_points": [fake_paragraph(topic, stable_int(seed, index)) for index in range(3)],
+    }
+
+def json_for_prompt(prompt, topic, seed):
+    # Each shape mirrors the keys the matching prompt asks for, so the app's validators accept it.
+    if "title_for_the_content" in prompt:
+        return content_json(topic, seed)
+    if "skill_area" in prompt and "options" in prompt:
+        return quiz_json(prompt, seed)
+    if "**Skill Area:**" in prompt and "recommendations" in prompt:
+        return soft_skill_report_json(prompt, seed)
+    if re.search(r"generate six '?(sub-)?modules?", prompt, re.IGNORECASE):
+        return submodule_names_json(topic, seed)
+    return default_json(topic, seed)
+
+def prompt_text(body):
+    texts = []
+    system_instruction = body.get("systemInstruction") or body.get("system_instruction")
+    for content in ([system_instruction] if system_instruction else []) + body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+    return "\n".join(texts)
+
+def create_fake_app(config):
+    app = Flask(__name__)
+    faults = FaultInjector(config)
+    files = {}
+
+    def respond(service, build):
+        latency, status = faults.sample(service)
+        time.sleep(latency)
+        if status == 429:
+            return jsonify({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}}), 429, {"Retry-After": "1"}
+        if status is not None:
+            return jsonify({"error": {"code": status, "message": "The service is currently unavailable.", "status": "UNAVAILABLE"}}), status
+        return build()
+
+    def template_for(prompt):
+        for template in faults.config.get("templates", []):
+            if template.get("match", "").lower() in prompt.lower():
+                return template.get("response")
+        return None
+
+    def completion_text(body):
+        prompt = prompt_text(body)
+        topic = prompt_topic(prompt)
+        seed = stable_int(prompt)
+        generation_config = body.get("generationConfig", {})
+        template = template_for(prompt)
+        if template is not None:
+            return template if isinstance(template, str) else json.dumps(template)
+        schema = generation_config.get("responseSchema")
+        if schema:
+            return json.dumps(value_for_schema(schema, None, topic, seed, topics=prompt_list_items(prompt)))
+        if generation_config.get("responseMimeType") == "application/json":
+            return json.dumps(json_for_prompt(prompt, topic, seed))
+        return fake_paragraph(topic, seed)
+
+    def completion(body):
+        text = completion_text(body)
+        prompt_tokens = len(prompt_text(body)) // 4 + 1
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": len(text) // 4 + 1,
+                "totalTokenCount": prompt_tokens + len(text) // 4 + 1,
+            },
+            "modelVersion": "fake",
+        }
+
+    def embedding(text):
+        rng = random.Random(stable_int(text))
+        values = [rng.gauss(0, 1) for _ in range(faults.config["embedding_dimensions"])]
+        norm = math.sqrt(sum(value * value for value in values)) or 1.0
+        return {"values": [value / norm for value in values]}
+
+    @app.route("/gemini/<version>/models/<model>:generateContent", methods=["POST"])
+    def generate_content(version, model):
+        body = request.get_json(force=True)
+        return respond("gemini", lambda: jsonify(completion(body)))
+
+    @app.route("/gemini/<version>/models/<model>:streamGenerateContent", methods=["POST"])
+    def stream_generate_content(version, model):
+        body = request.get_json(force=True)
+        return respond("gemini", lambda: Response(f"data: {json.dumps(completion(body))}\n\n", mimetype="text/event-stream"))
+
+    @app.route("/gemini/<version>/models/<model>:embedContent", methods=["POST"])
+    def embed_content(version, model):
+        body = request.get_json(force=True)
+        return respond("embeddings", lambda: jsonify({"embedding": embedding(prompt_text({"contents": [body.get("content", {})]}))}))
+
+    @app.route("/gemini/<version>/models/<model>:batchEmbedContents", methods=["POST"])
+    def batch_embed_contents(version, model):
+        body = request.get_json(force=True)
+        texts = [prompt_text({"contents": [item.get("content", {})]}) for item in body.get("requests", [])]
+        return respond("embeddings", lambda: jsonify({"embeddings": [embedding(text) for text in texts]}))
+
+    @app.route("/gemini/<version>/cachedContents", methods=["POST"])
+    def create_cached_content(version):
+        name = f"cachedContents/fake-{len(files)}-{int(time.time() * 1000)}"
+        return respond("gemini", lambda: jsonify({"name": name, "model": request.get_json(force=True).get("model")}))
+
+    @app.route("/gemini/<version>/cachedContents/<name>", methods=["DELETE", "GET"])
+    def cached_content(version, name):
+        return jsonify({} if request.method == "DELETE" else {"name": f"cachedContents/{name}"})
+
+    @app.route("/gemini/upload/<version>/files", methods=["POST"])
+    def upload_file(version):
+        command = request.headers.get("X-Goog-Upload-Command", "")
+        if "start" in command:
+            upload_id = f"fake-{int(time.time() * 1000)}-{len(files)}"
+            return Response(status=200, headers={"X-Goog-Upload-URL": f"{request.base_url}?upload_id={upload_id}", "X-Goog-Upload-Status": "active"})
+        upload_id = request.args.get("upload_id", str(len(files)))
+        name = f"files/{upload_id}"
+        files[name] = {
+            "name": name,
+            "uri": f"{request.host_url}gemini/{version}/{name}",
+            "mimeType": request.headers.get("X-Goog-Upload-Header-Content-Type", "application/octet-stream"),
+            "sizeBytes": str(len(request.get_data())),
+            "state": "ACTIVE",
+        }
+        return Response(json.dumps({"file": files[name]}), mimetype="application/json", headers={"X-Goog-Upload-Status": "final"})
+
+    @app.route("/gemini/<version>/files/<name>", methods=["GET", "DELETE"])
+    def file_resource(version, name):
+        if request.method == "DELETE":
+            files.pop(f"files/{name}", None)
+            return jsonify({})
+        if f"files/{name}" not in files:
+            return jsonify({"error": {"code": 404, "message": "File not found.", "status": "NOT_FOUND"}}), 404
+        return jsonify(files[f"files/{name}"])
+
+    @app.route("/tavily/search", methods=["POST"])
+    def tavily_search():
+        body = request.get_json(force=True)
+        query = body.get("query", "")
+        max_results = int(body.get("max_results", 5))
+
+        def build():
+            results = [{
+                "title": f"{query.title()} - resource {index + 1}",
+                "url": f"https://example.com/{stable_int(query, index)}",
+                "content": fake_paragraph(query, stable_int(query, index)),
+                "score": round(0.95 - index * 0.05, 2),
+            } for index in range(max_results)]
+            return jsonify({"query": query, "results": results, "images": [], "response_time": 0.1})
+
+        return respond("tavily", build)
+
+    @app.route("/serper/images", methods=["POST"])
+    def serper_images():
+        body = request.get_json(force=True)
+        query = body.get("q", "")
+
+        def build():
+            images = [{
+                "title": f"{query} diagram {index + 1}",
+                "imageUrl": f"https://images.example.com/{stable_int(query, index)}.jpg",
+                "link": f"https://example.com/{stable_int(query, index)}",
+            } for index in range(10)]
+            return jsonify({"searchParameters": {"q": query, "type": "images"}, "images": images})
+
+        return respond("serper", build)
+
+    @app.route("/serpapi/search", methods=["GET"])
+    @app.route("/serpapi/search.json", methods=["GET"])
+    def serpapi_search():
+        query = request.args.get("q", "")
+        engine = request.args.get("engine", "google")
+
+        def build():
+            if engine == "google_videos":
+                videos = [{"title": f"{query} explained {index + 1}", "link": f"https://www.youtube.com/watch?v={stable_int(query, index) % 10 ** 11:011d}"} for index in range(10)]
+                return jsonify({"search_parameters": {"q": query, "engine": engine}, "video_results": videos})
+            organic = [{
+                "source": source,
+                "title": f"{query} | {source}",
+                "link": f"https://www.{source.lower()}.example/{stable_int(query, source)}",
+                "sitelinks": {"inline": [{"title": f"{query} course {index + 1}", "link": f"https://www.{source.lower()}.example/course/{stable_int(query, source, index)}"} for index in range(3)]},
+            } for source in ("Coursera", "edX", "Udemy")]
+            return jsonify({"search_parameters": {"q": query, "engine": engine}, "organic_results": organic})
+
+        return respond("serpapi", build)
+
+    @app.route("/_fake/config", methods=["GET", "POST"])
+    def fake_config():
+        if request.method == "POST":
+            overrides = request.get_json(force=True)
+            config = json.loads(json.dumps(faults.config))
+            for service, settings in overrides.pop("services", {}).items():
+                config["services"].setdefault(service, dict(DEFAULT_SERVICE_CONFIG)).update(settings)
+            config.update(overrides)
+            faults.configure(config)
+        return jsonify(faults.config)
+
+    @app.route("/_fake/stats", methods=["GET"])
+    def fake_stats():
+        return jsonify(faults.get_stats())
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Gemini, Tavily, Serper and SerpApi.")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_SERVICES_PORT", 8765)))
+    parser.add_argument("--config", default=None, help="JSON file overriding latency, error rate, 429 bursts and templates")
+    args = parser.parse_args()
+    create_fake_app(load_config(args.config)).run(port=args.port, threaded=True)
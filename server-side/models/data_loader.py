@@ -66,10 +66,12 @@ class DocumentLoader:
             for file in files:
                 if file.endswith(('png', 'jpg', 'jpeg')):
                     images_in_directory.append(os.path.join(root, file))
+        # Row i of the index is images_in_directory[i], sorted so the order does not depend on the filesystem.
+        images_in_directory.sort()
         
         image_embeddings = np.vstack([DocumentUtils.embed_image_with_clip(image, clip_model=clip_model, clip_processor=clip_processor) for image in images_in_directory])
         print("\nImages converted to embeddings\n")
         vectorstore = faiss.IndexFlatIP(512)
         vectorstore.add(image_embeddings)
         print("\nFAISS Vector database for images created.\n")
-        return vectorstore
+        return vectorstore, images_in_directory
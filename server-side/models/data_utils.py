@@ -71,6 +71,15 @@ class DocumentUtils:
         text_features_normalized = text_features / text_features.norm(dim=-1, keepdim=True)
         text_features_normalized = text_features_normalized.cpu().numpy()
         return text_features_normalized
+
+    @staticmethod
+    def embed_texts_with_clip(texts, clip_model, clip_tokenizer, device_type="cpu"):
+        inputs = clip_tokenizer(texts, padding=True, truncation=True, return_tensors="pt").to(device_type)
+        with torch.no_grad():
+            text_features = clip_model.get_text_features(**inputs)
+        text_features_normalized = text_features / text_features.norm(dim=-1, keepdim=True)
+        text_features_normalized = text_features_normalized.cpu().numpy()
+        return text_features_normalized
     
     @staticmethod
     def image_to_base64(image_path):
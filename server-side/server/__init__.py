@@ -1,6 +1,8 @@
-from flask import Flask
+from flask import Flask, Response, jsonify
 from server.config import Config
 from flask_cors import CORS
+from api.retry_policy import LLMRequestError
+from api.telemetry import LLM_TELEMETRY
 def create_app():
     app = Flask(__name__)
 
@@ -12,4 +14,16 @@ def create_app():
     from server.company.routes import company
     app.register_blueprint(students)
     app.register_blueprint(company)
+
+    @app.errorhandler(LLMRequestError)
+    def handle_llm_request_error(error):
+        return jsonify({"message": "The language model is unavailable right now, please try again later.", "error": str(error), "category": error.category, "response": False}), 503
+
+    @app.route("/llm-metrics", methods=["GET"])
+    def llm_metrics():
+        return jsonify(LLM_TELEMETRY.snapshot())
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(LLM_TELEMETRY.to_prometheus(), mimetype="text/plain; version=0.0.4")
     return app
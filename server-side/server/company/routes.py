@@ -1,9 +1,11 @@
 import os
-from flask import request, session, jsonify, send_file, Blueprint, send_from_directory
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import queue
+import threading
+from flask import request, session, jsonify, send_file, Blueprint, send_from_directory, Response
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask_cors import cross_origin
 from werkzeug.utils import secure_filename
-from langchain_community.vectorstores import FAISS
 from api.serper_client import SerperProvider
 from core.rag import MultiModalRAG, SimpleRAG
 from server.constants import *
@@ -221,7 +223,7 @@ async def multimodal_rag_submodules():
     
     lesson_name = re.sub(r'[<>:"/\\|?*]', '_', lesson_name)
     current_dir = os.path.dirname(__file__)
-    uploads_path = os.path.join(current_dir, 'uploaded-documents', lesson_name)
+    uploads_path = os.path.join(current_dir, 'uploaded-documents', str(company_id), lesson_name)
     if not os.path.exists(uploads_path):
         os.makedirs(uploads_path)
     
@@ -255,7 +257,8 @@ async def multimodal_rag_submodules():
             clip_tokenizer=CLIP_TOKENIZER,
             input_type="pdf_and_link",
             links=links_list,
-            include_images=include_images
+            include_images=include_images,
+            company_id=company_id
         )
     elif len(files)>0 and search_web:
         session['input_type']='pdf_and_web'
@@ -271,7 +274,8 @@ async def multimodal_rag_submodules():
             clip_tokenizer=CLIP_TOKENIZER,
             input_type="pdf_and_web",
             links=links_list,
-            include_images=include_images
+            include_images=include_images,
+            company_id=company_id
         )
     elif len(files)>0:
         session['input_type']='pdf'
@@ -286,7 +290,8 @@ async def multimodal_rag_submodules():
             clip_processor=CLIP_PROCESSOR,
             clip_tokenizer=CLIP_TOKENIZER,
             input_type="pdf",
-            include_images=include_images
+            include_images=include_images,
+            company_id=company_id
         )
     elif len(links_list)>0:
         session['input_type']='link'
@@ -302,7 +307,8 @@ async def multimodal_rag_submodules():
             clip_tokenizer=CLIP_TOKENIZER,
             input_type="link",
             links=links_list,
-            include_images=include_images
+            include_images=include_images,
+            company_id=company_id
         )
     elif search_web:
         session['input_type']='web'
@@ -333,7 +339,7 @@ async def multimodal_rag_submodules():
     session['text_vectorstore_path'] = text_vectorstore_path
     session['image_vectorstore_path'] = image_vectorstore_path
     
-    VECTORDB_TEXTBOOK = FAISS.load_local(text_vectorstore_path, EMBEDDINGS, allow_dangerous_deserialization=True)
+    VECTORDB_TEXTBOOK = multimodal_rag.text_vectorstore
     
     if search_web:
         submodules = await SUB_MODULE_GENERATOR.generate_submodules_from_documents_and_web(module_name=lesson_name, course_name=course_name, vectordb=VECTORDB_TEXTBOOK)
@@ -357,6 +363,24 @@ def update_submodules():
     session['submodules'] = updated_submodules
     return jsonify({'message': 'Submodules updated successfully'}), 200
 
+def load_lesson_rag(course_name, lesson_name, document_paths, input_type, text_vectorstore_path, image_vectorstore_path, include_images):
+    return MultiModalRAG(
+        course_name=course_name,
+        documents_directory_path=document_paths,
+        lesson_name=lesson_name,
+        embeddings=EMBEDDINGS,
+        clip_model=CLIP_MODEL,
+        clip_processor=CLIP_PROCESSOR,
+        clip_tokenizer=CLIP_TOKENIZER,
+        chunk_size=1000,
+        chunk_overlap=200,
+        image_similarity_threshold=0.1,
+        input_type=input_type,
+        text_vectorstore_path=text_vectorstore_path,
+        image_vectorstore_path=image_vectorstore_path,
+        include_images=include_images
+    )
+
 @company.route('/multimodal-rag-content', methods=['GET'])
 async def multimodal_rag_content():
     company_id = session.get('company_id')
@@ -376,60 +400,96 @@ async def multimodal_rag_content():
         image_vectorstore_path = session.get("image_vectorstore_path")
         input_type = session.get('input_type')
         include_images=session.get('include_images')
-        multimodal_rag = MultiModalRAG(
-            course_name=course_name,
-            documents_directory_path=document_paths,
-            lesson_name=lesson_name,
-            embeddings=EMBEDDINGS,
-            clip_model=CLIP_MODEL,
-            clip_processor=CLIP_PROCESSOR,
-            clip_tokenizer=CLIP_TOKENIZER,
-            chunk_size=1000,
-            chunk_overlap=200,
-            image_similarity_threshold=0.1,
-            input_type=input_type,
-            text_vectorstore_path=text_vectorstore_path,
-            image_vectorstore_path=image_vectorstore_path,
-            include_images=include_images
-        )
+        multimodal_rag = load_lesson_rag(course_name, lesson_name, document_paths, input_type, text_vectorstore_path, image_vectorstore_path, include_images)
         content_list, relevant_images_list = await multimodal_rag.execute(CONTENT_GENERATOR, TAVILY_CLIENT, lesson_name, submodules=submodules, profile=user_profile, top_k_docs=7, search_web=search_web)
         final_content = ServerUtils.json_list_to_markdown(content_list)
         return jsonify({"message": "Query successful", "relevant_images": relevant_images_list, "content": final_content, "response": True}), 200
-    elif search_web:
-        keys_list = list(submodules.keys())
-        submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
-        submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
-        submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
-        with ThreadPoolExecutor() as executor:
-            future_images_list = executor.submit(SerperProvider.module_image_from_web, submodules)
-            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_from_web_with_profile, submodules_split_one, lesson_name, course_name, lesson_type, user_profile, 'first')
-            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_from_web_with_profile, submodules_split_two, lesson_name, course_name, lesson_type, user_profile, 'second')
-            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_from_web_with_profile, submodules_split_three, lesson_name, course_name, lesson_type, user_profile, 'third')
-        content_one = future_content_one.result()
-        content_two = future_content_two.result()
-        content_three = future_content_three.result()
-        relevant_images_list = future_images_list.result()
-        content_list = content_one + content_two + content_three
-        final_content = ServerUtils.json_list_to_markdown(content_list)
-        return jsonify({"message": "Query successful", "relevant_images": relevant_images_list, "content": final_content, "response": True}), 200
     else:
-        keys_list = list(submodules.keys())
-        submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
-        submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
-        submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
         with ThreadPoolExecutor() as executor:
             future_images_list = executor.submit(SerperProvider.module_image_from_web, submodules)
-            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_with_profile, submodules_split_one, lesson_name, course_name, lesson_type, user_profile, 'first')
-            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_with_profile, submodules_split_two, lesson_name, course_name, lesson_type, user_profile, 'second')
-            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_with_profile, submodules_split_three, lesson_name, course_name, lesson_type, user_profile, 'third')
-        content_one = future_content_one.result()
-        content_two = future_content_two.result()
-        content_three = future_content_three.result()
+            future_content = executor.submit(CONTENT_GENERATOR.generate_content_batch_with_profile, submodules, lesson_name, course_name, lesson_type, user_profile, search_web=bool(search_web))
+        content_list = future_content.result()
         relevant_images_list = future_images_list.result()
-        content_list = content_one + content_two + content_three
         final_content = ServerUtils.json_list_to_markdown(content_list)
         return jsonify({"message": "Query successful", "relevant_images": relevant_images_list, "content": final_content, "response": True}), 200
 
+@company.route('/multimodal-rag-content-stream', methods=['GET'])
+def multimodal_rag_content_stream():
+    company_id = session.get('company_id')
+    if company_id is None:
+        return jsonify({"message": "company not logged in", "response": False}), 401
+
+    is_multimodal_rag = session.get("is_multimodal_rag")
+    search_web = session.get("search_web")
+    course_name = session.get("course_name")
+    lesson_name = session.get("lesson_name")
+    lesson_type = session.get("lesson_type")
+    user_profile = session.get("user_profile")
+    submodules = session.get("submodules")
+    document_paths = session.get("document_directory_path")
+    text_vectorstore_path = session.get("text_vectorstore_path")
+    image_vectorstore_path = session.get("image_vectorstore_path")
+    input_type = session.get('input_type')
+    include_images = session.get('include_images')
+    if not submodules:
+        return jsonify({"message": "No submodules found for this lesson", "response": False}), 400
+    events = queue.Queue()
+
+    def on_result(index, output, relevant_images):
+        events.put(("submodule", {
+            "index": index,
+            "subject_name": output.get("subject_name"),
+            "content": ServerUtils.json_list_to_markdown([output])[0],
+            "relevant_images": relevant_images,
+        }))
+
+    def generate_web_or_plain_submodule(index, key, val, future_images_list):
+        if search_web:
+            output = CONTENT_GENERATOR.generate_content_from_web_with_profile({key: val}, lesson_name, course_name, lesson_type, user_profile)[0]
+        else:
+            output = CONTENT_GENERATOR.generate_content_with_profile({key: val}, lesson_name, course_name, lesson_type, user_profile)[0]
+        # Images are searched once for the whole lesson so they are deduplicated exactly as in /multimodal-rag-content.
+        relevant_images = future_images_list.result()[index]
+        return index, output, relevant_images
+
+    def produce():
+        try:
+            if is_multimodal_rag:
+                multimodal_rag = load_lesson_rag(course_name, lesson_name, document_paths, input_type, text_vectorstore_path, image_vectorstore_path, include_images)
+                asyncio.run(multimodal_rag.execute(CONTENT_GENERATOR, TAVILY_CLIENT, lesson_name, submodules=submodules, profile=user_profile, top_k_docs=7, search_web=search_web, on_result=on_result))
+            else:
+                with ThreadPoolExecutor() as executor:
+                    future_images_list = executor.submit(SerperProvider.module_image_from_web, submodules)
+                    futures = [executor.submit(generate_web_or_plain_submodule, index, key, val, future_images_list) for index, (key, val) in enumerate(submodules.items())]
+                    for future in as_completed(futures):
+                        on_result(*future.result())
+            events.put(("complete", {"message": "Query successful", "total": len(submodules), "response": True}))
+        except Exception as e:
+            events.put(("error", {"message": "Content generation failed", "error": str(e), "response": False}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    def stream():
+        completed = 0
+        yield ServerUtils.format_sse("progress", {"completed": completed, "total": len(submodules), "status": "started"})
+        while True:
+            try:
+                item = events.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            event, data = item
+            yield ServerUtils.format_sse(event, data)
+            if event == "submodule":
+                completed += 1
+                yield ServerUtils.format_sse("progress", {"completed": completed, "total": len(submodules), "status": "generating", "subject_name": data["subject_name"]})
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @company.route('/add-lesson', methods=['POST'])
 def add_lesson():
     company_id = session.get('company_id')
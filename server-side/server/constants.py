@@ -2,7 +2,7 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import torch
 from transformers import AutoImageProcessor, AutoModel, AutoTokenizer
 from api.gemini_client import GeminiProvider
-from api.tavily_client import TavilyProvider
+from api.tavily_client import TAVILY_CLIENT
 from api.serper_client import SerperProvider
 from core.submodule_generator import SubModuleGenerator
 from core.content_generator import ContentGenerator
@@ -17,9 +17,11 @@ IMAGE_EMBEDDING_MODEL_NAME = "openai/clip-vit-base-patch16"
 CLIP_MODEL = AutoModel.from_pretrained(IMAGE_EMBEDDING_MODEL_NAME).to(DEVICE_TYPE)
 CLIP_PROCESSOR = AutoImageProcessor.from_pretrained(IMAGE_EMBEDDING_MODEL_NAME)
 CLIP_TOKENIZER = AutoTokenizer.from_pretrained(IMAGE_EMBEDDING_MODEL_NAME, clean_up_tokenization_spaces=True)
-EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-GEMINI_CLIENT = GeminiProvider()
-TAVILY_CLIENT = TavilyProvider()
+if os.getenv("GEMINI_BASE_URL"):
+    EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", transport="rest", client_options={"api_endpoint": os.getenv("GEMINI_BASE_URL").rstrip("/")})
+else:
+    EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+GEMINI_CLIENT = GeminiProvider(caller="server")
 SERPER_CLIENT = SerperProvider()
 SUB_MODULE_GENERATOR = SubModuleGenerator()
 CONTENT_GENERATOR = ContentGenerator()
@@ -388,9 +388,9 @@ def personalized_module_content():
         submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
         submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
         submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
-        future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_one,description,VECTORDB_TEXTBOOK,'first')
-        future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_two,description,VECTORDB_TEXTBOOK,'second')
-        future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_three,description,VECTORDB_TEXTBOOK,'third')
+        future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_one,description,VECTORDB_TEXTBOOK)
+        future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_two,description,VECTORDB_TEXTBOOK)
+        future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_from_textbook,topic,title ,submodules_split_three,description,VECTORDB_TEXTBOOK)
 
     # Retrieve the results when both functions are done
     content_one = future_content_one.result()
@@ -536,9 +536,9 @@ def course_overview(module_id, source_language, websearch):
             submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
             submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
             submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
-            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_one, module.module_name,topic, 'first')
-            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_two, module.module_name,topic, 'second')
-            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_three, module.module_name,topic, 'third')
+            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_one, module.module_name,topic)
+            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_two, module.module_name,topic)
+            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content_from_web, submodules_split_three, module.module_name,topic)
 
         else:
             submodules = SUB_MODULE_GENERATOR.generate_submodules(module.module_name)
@@ -549,9 +549,9 @@ def course_overview(module_id, source_language, websearch):
             submodules_split_one = {key: submodules[key] for key in keys_list[:2]}
             submodules_split_two = {key: submodules[key] for key in keys_list[2:4]}
             submodules_split_three = {key: submodules[key] for key in keys_list[4:]}
-            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_one, module.module_name,topic,'first')
-            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_two, module.module_name,topic,'second')
-            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_three, module.module_name,topic,'third')
+            future_content_one = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_one, module.module_name,topic)
+            future_content_two = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_two, module.module_name,topic)
+            future_content_three = executor.submit(CONTENT_GENERATOR.generate_content, submodules_split_three, module.module_name,topic)
 
     content_one = future_content_one.result()
     content_two = future_content_two.result()
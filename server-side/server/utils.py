@@ -5,6 +5,7 @@ from flask import session
 from lingua import LanguageDetectorBuilder
 import random
 import string
+import json
 
 
 LANG_DETECTOR = LanguageDetectorBuilder.from_all_languages().with_preloaded_language_models().build()
@@ -137,6 +138,10 @@ class ServerUtils:
             final_content.append({content["subject_name"]: markdown})
         return final_content
     
+    @staticmethod
+    def format_sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
     @staticmethod
     def generate_course_code(course_collection, length=6):
         while True: